@@ -2,13 +2,19 @@
 #
 #SBATCH --partition m
 #SBATCH --tasks=1
+#SBATCH --cpus-per-task=8
 #SBATCH --mem-per-cpu=3000
 #SBATCH --nice=10000
 #SBATCH --time=7-00:00
 #SBATCH --output=slurm_out/%j
 #SBATCH --error=slurm_error/%j
 
-import taskdb2, snappy, foliar
+import os
+import snappy, foliar, task_queue
+
+workers = int(os.environ.get('SLURM_CPUS_PER_TASK', 1))
+# Must be on a disk local to the node; see task_queue.
+database = task_queue.database_from_environment()
 
 def search_for_taut(task):
     M = snappy.Manifold(task['isosig'])
@@ -18,5 +24,4 @@ def search_for_taut(task):
         task['laminar_tri'] = fol.mcomplex.name
         task['done'] = True
         
-exdb = taskdb2.ExampleDatabase('foliate_double')
-exdb.run_function('task_fol', search_for_taut, columns=['isosig'])
+task_queue.run_function(database, 'task_fol', search_for_taut, workers)
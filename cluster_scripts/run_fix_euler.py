@@ -2,26 +2,33 @@
 #
 #SBATCH --partition m
 #SBATCH --tasks=1
+#SBATCH --cpus-per-task=8
 #SBATCH --mem-per-cpu=3000
 #SBATCH --nice=10000
 #SBATCH --time=7-00:00
 #SBATCH --output=slurm_out/%j
 #SBATCH --error=slurm_error/%j
 
-import taskdb2.worker
+import os
 import snappy
 import snappy.snap.t3mlite as t3m
-from edge_orient import EdgeOrientation
+from edge_orient import EdgeOrientation, euler_classes_vanish
+from compiled import cached_mcomplex
+import task_queue
+
+workers = int(os.environ.get('SLURM_CPUS_PER_TASK', 1))
+# Must be on a disk local to the node; see task_queue.
+database = task_queue.database_from_environment()
 
 def compute_euler(task):
-    N = t3m.Mcomplex(str(task['foliar_tri']))
+    N = cached_mcomplex(str(task['foliar_tri']))
     signs = eval(task['foliar_orients'])
     orients =  [EdgeOrientation(N, s) for s in signs]
     assert all(eo.gives_foliation() for eo in orients)
     task['vertices_foliar'] = len(N.Vertices)
     if len(N.Vertices) == 1:
-        task['new_taut_euler_0'] = repr([1 if eo.euler_class_vanishes() else 0
-                                     for eo in orients]).replace(' ', '')
+        task['new_taut_euler_0'] = repr([1 if v else 0
+                                     for v in euler_classes_vanish(orients)]).replace(' ', '')
     task['done'] = True
 
 
@@ -29,4 +36,4 @@ task1 = {'name':'m376(-2, 3)',
          'foliar_tri':'oLLvLMLPQQcacgikmkimjlnnnmnkjaaagnnnwkwkw',
          'foliar_orients':'[[1,1,-1,1,1,-1,-1,1,1,1,1,-1,1,1,-1]]'}
 
-taskdb2.worker.run_function('QHSpheres', 'task_double_check_euler', compute_euler)
+task_queue.run_function(database, 'task_double_check_euler', compute_euler, workers)
@@ -2,6 +2,7 @@
 #
 #SBATCH --partition m
 #SBATCH --tasks=1
+#SBATCH --cpus-per-task=8
 #SBATCH --mem-per-cpu=3000
 #SBATCH --nice=10000
 #SBATCH --time=7-00:00
@@ -9,14 +10,17 @@
 #SBATCH --error=slurm_error/%j
 
 
-import taskdb2, snappy, edge_orient
+import os
+import snappy, edge_orient, task_queue
+
+workers = int(os.environ.get('SLURM_CPUS_PER_TASK', 1))
+# Must be on a disk local to the node; see task_queue.
+database = task_queue.database_from_environment()
 
 def create_database():
-    examples = [M.name() for M in snappy.OrientableCuspedCensus(cusps=1)]
-    columns = [('degeneracy_slopes', 'text'), ('persistent_triangulations', 'text')]
-    db = taskdb2.ExampleDatabase('persistent_cusped', examples, columns)
-    db.new_task_table('task_find_laminar')
-    return db
+    Q = task_queue.TaskQueue(database, 'task_find_laminar')
+    Q.add({'name': M.name()} for M in snappy.OrientableCuspedCensus(cusps=1))
+    return Q
 
 def search_for_persistent(task):
     M = snappy.Triangulation(task['name'])
@@ -25,8 +29,7 @@ def search_for_persistent(task):
     task['persistent_triangulations'] = repr(tris)
     task['done'] = True
 
-exdb = taskdb2.ExampleDatabase('persistent_cusped')
-exdb.run_function('task_find_laminar', search_for_persistent)
+task_queue.run_function(database, 'task_find_laminar', search_for_persistent, workers)
 
 
 
@@ -23,14 +23,12 @@ def other_dehn_fillings(M, max_denom):
         slopes += [(i, 1), (-i, 1)]
     return slopes
 
-def have_taut_foliation(M, fillings):
+def have_taut_foliation(M, fillings, workers=None):
+    classified = foliar.classify_fillings(M, fillings, workers=workers)
     ans = []
     for slope in fillings:
-        N = M.copy()
-        N.dehn_fill(slope)
-        F = foliar.first_foliation(N)
-        if F is not None:
-            print(slope)
+        if classified[slope] is not None:
+            print(slope, classified[slope][0])
             ans.append(slope)
     return ans
 
@@ -1,4 +1,5 @@
 from foliar import edge_orient, find_orient, util
+from foliar.compiled import cached_mcomplex
 import snappy
 import snappy.snap.t3mlite as t3m
 from collections import Counter
@@ -22,7 +23,7 @@ def edge_orientation_stats(manifold):
 
 def first_foliation(snappy_manifold, max_triangulations=10):
     for iso in util.closed_isosigs(snappy_manifold)[:max_triangulations]:
-        T = t3m.Mcomplex(iso)
+        T = cached_mcomplex(iso)
         T.name = iso
         if len(T.Vertices) == 1 and T.Vertices[0].link_genus() == 0:
             orient = list(edge_orient.edge_orientations(T))
@@ -40,7 +41,7 @@ def try_persistent(snappy_manifold):
             print slopes
 
 def tri_supports_foliation(iso):
-    T = t3m.Mcomplex(iso)
+    T = cached_mcomplex(iso)
     for eo in edge_orient.edge_orientations(T):
         if eo.gives_foliation():
             return eo
@@ -1,7 +1,14 @@
-from . import main, edge_orient, find_orient, peripheral
-from .main import first_foliation
+from . import main, edge_orient, find_orient
+from .main import first_foliation, classify_fillings
 from .edge_orient import (EdgeOrientation,
                          IdealEdgeOrientation,
                          edge_orientations,
                          degeneracy_slopes,
                          degeneracy_slopes_with_search)
+
+def __getattr__(name):
+    # The submodules for cusped manifolds are loaded on first use.
+    if name in ('peripheral', 'link', 'surface', 'dual_cellulation'):
+        import importlib
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
@@ -0,0 +1,246 @@
+"""
+Everything the orientation search derives from a triangulation,
+flattened into tuples of integers so that it can be cached by isosig
+and pickled.  Revisiting an isosig in the same process then skips
+building the Mcomplex altogether, and when a cache directory is set,
+later processes skip recomputing the tables; see TriangulationCache.
+The quick test main._may_be_foliar only needs the compiled data, so
+on a disk hit the triangulations it rejects are neither decoded nor
+built as Mcomplexes.
+
+The default cache persists to disk only if the environment variable
+FOLIAR_TRIANGULATION_CACHE names a directory.
+"""
+
+import os
+import collections
+import hashlib
+import pickle
+import tempfile
+import snappy.snap.t3mlite as t3m
+from snappy.snap.t3mlite.simplex import ZeroSubsimplices
+from . import find_orient, edge_orient
+from .isosig import DecodedTriangulation, TriangulationTables
+
+# The ordered pairs of vertices of a tetrahedron, i.e. its possible arrows.
+Arrows = [(a, b) for a in ZeroSubsimplices for b in ZeroSubsimplices if a != b]
+
+class CompiledTriangulation(TriangulationTables):
+    """
+    The tet-edge incidences with their orientations (one (edge, sign)
+    pair for each arrow of each tetrahedron), the cycles of edges
+    around the faces, the corners of each edge, and the tables of
+    edge_orient.record_tetrahedron_tables.  These are read directly
+    off the isosig when possible, and otherwise off the Mcomplex.
+
+    >>> C = CompiledTriangulation('jLLvQPQcdfhghigiihshhgfifme')
+    >>> C.num_tetrahedra, C.num_edges, C.num_faces, C.num_vertices
+    (9, 10, 18, 1)
+    >>> len(C.face_cycles), sum(len(corners) for corners in C.edge_corners)
+    (36, 54)
+    >>> N = C.mcomplex()
+    >>> find_orient.oriented_edges_around_faces(N) == [list(f) for f in C.face_cycles]
+    True
+    >>> len([eo for eo in edge_orient.edge_orientations(N) if eo.num_sutures() == 1])
+    8
+    """
+    def __init__(self, isosig, mcomplex=None):
+        self.isosig = isosig
+        if mcomplex is None:
+            try:
+                self._from_decoded(DecodedTriangulation(isosig))
+                return
+            except ValueError:
+                mcomplex = t3m.Mcomplex(isosig)
+        self._from_mcomplex(mcomplex)
+
+    def _from_decoded(self, D):
+        """
+        Without building an Mcomplex; see isosig.DecodedTriangulation.
+        """
+        self.num_tetrahedra = D.num_tetrahedra
+        self.num_edges = D.num_edges
+        self.num_faces = D.num_faces
+        self.num_vertices = D.num_vertices
+        self.vertex_link_genera = D.vertex_link_genera
+        self.tet_edges = tuple(tuple(info[a, b] for a, b in Arrows)
+                               for info in D.edge_info)
+        self.face_cycles = D.face_cycles
+        self.edge_corners = D.edge_corners
+        self.tet_tables = tuple((edges, tuple(table))
+                                for edges, table in D.tet_tables)
+        self.edge_ends = D.edge_ends
+        loops = {a for a, b in D.edge_ends if a == b}
+        self.every_vertex_has_loop = len(loops) == D.num_vertices
+
+    def _from_mcomplex(self, M):
+        if not hasattr(M, '_tet_tables'):
+            edge_orient.record_tetrahedron_tables(M)
+        find_orient.oriented_edges_around_faces(M)
+        self.num_tetrahedra = len(M.Tetrahedra)
+        self.num_edges = len(M.Edges)
+        self.num_faces = len(M.Faces)
+        self.num_vertices = len(M.Vertices)
+        self.vertex_link_genera = tuple(v.link_genus() for v in M.Vertices)
+        self.tet_edges = tuple(tuple(tet.edge_info[a, b] for a, b in Arrows)
+                               for tet in M.Tetrahedra)
+        self.face_cycles = M._face_cycles
+        self.edge_corners = tuple(tuple((c.Tetrahedron.Index, c.Subsimplex)
+                                        for c in edge.Corners)
+                                  for edge in M.Edges)
+        self.tet_tables = tuple((edges, tuple(table))
+                                for edges, table in M._tet_tables)
+        self.edge_ends = tuple(M._edge_ends)
+        self.every_vertex_has_loop = M._every_vertex_has_loop
+
+    def attach(self, mcomplex):
+        """
+        Installs the cached data on an Mcomplex built from self.isosig,
+        in the attributes where find_orient and edge_orient look for it.
+        """
+        M = mcomplex
+        assert len(M.Tetrahedra) == self.num_tetrahedra
+        M._edge_info = dict()
+        for tet, arrows in zip(M.Tetrahedra, self.tet_edges):
+            tet.edge_info = info = dict(zip(Arrows, arrows))
+            for a in ZeroSubsimplices:
+                info[a] = tuple(info[a, b] for b in ZeroSubsimplices if b != a)
+        M._face_cycles = self.face_cycles
+        M._tet_tables = self.tet_tables
+        M._edge_ends = list(self.edge_ends)
+        M._every_vertex_has_loop = self.every_vertex_has_loop
+        return M
+
+    def mcomplex(self):
+        return self.attach(t3m.Mcomplex(self.isosig))
+
+    @property
+    def edge_info(self):
+        """
+        The "edge_info" dict of each tetrahedron, for the clauses of
+        isosig.TriangulationTables.
+
+        >>> C = CompiledTriangulation('jLvLQAQbffghghiiieuaiikktuu')
+        >>> import pycosat
+        >>> len(list(pycosat.itersolve(C.orientation_clauses(True))))
+        9
+        """
+        return [dict(zip(Arrows, arrows)) for arrows in self.tet_edges]
+
+
+class TriangulationCache(object):
+    """
+    An LRU cache, keyed by isosig, of CompiledTriangulations and the
+    Mcomplexes built from them, holding at most max_size entries.  If
+    directory is given, each CompiledTriangulation is also pickled
+    there, written atomically so that several processes can share it.
+
+    The Mcomplexes returned are shared between callers, so should be
+    treated as read only apart from the caches stored on them.
+
+    >>> import tempfile
+    >>> cache = TriangulationCache(max_size=2, directory=tempfile.mkdtemp())
+    >>> isos = ['jLLvQPQcdfhghigiihshhgfifme', 'jLvLQAQbffghghiiieuaiikktuu',
+    ...         'lLLvMMMQccdfghhikkjjkhsawrksqqmdw']
+    >>> N = cache.mcomplex(isos[0])
+    >>> cache.mcomplex(isos[0]) is N
+    True
+    >>> [len(cache.mcomplex(iso)) for iso in isos[1:]]
+    [9, 11]
+    >>> len(cache), cache.mcomplex(isos[0]) is N
+    (2, False)
+    >>> fresh = TriangulationCache(directory=cache.directory)
+    >>> fresh.compiled(isos[2]).num_edges, fresh.disk_hits
+    (12, 1)
+    >>> with open(fresh._path(isos[1]), 'wb') as file:  # from an older version
+    ...     _ = file.write(b'c' + __name__.encode() + b'\\nOldCompiledTriangulation\\n.')
+    >>> stale = TriangulationCache(directory=cache.directory)
+    >>> stale.compiled(isos[1]).num_edges, stale.disk_hits
+    (10, 0)
+    """
+    def __init__(self, max_size=128, directory=None):
+        self.max_size = max_size
+        self.directory = directory
+        self.disk_hits = 0
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _path(self, isosig):
+        name = hashlib.sha1(isosig.encode('ascii')).hexdigest()
+        return os.path.join(self.directory, name + '.pickle')
+
+    def _load(self, isosig):
+        try:
+            with open(self._path(isosig), 'rb') as file:
+                compiled = pickle.load(file)
+        except Exception:
+            # Missing, truncated, or written by another version of
+            # CompiledTriangulation; either way, a cache miss.
+            return None
+        if getattr(compiled, 'isosig', None) != isosig:
+            return None
+        self.disk_hits += 1
+        return compiled
+
+    def _save(self, compiled):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                pickle.dump(compiled, file, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp, self._path(compiled.isosig))
+        except:
+            os.unlink(temp)
+            raise
+
+    def _entry(self, isosig):
+        entries = self._entries
+        if isosig in entries:
+            entries.move_to_end(isosig)
+            return entries[isosig]
+        compiled = None
+        if self.directory is not None:
+            compiled = self._load(isosig)
+        if compiled is None:
+            compiled = CompiledTriangulation(isosig)
+            if self.directory is not None:
+                self._save(compiled)
+        entry = entries[isosig] = [compiled, None]
+        while len(entries) > self.max_size:
+            entries.popitem(last=False)
+        return entry
+
+    def compiled(self, isosig):
+        return self._entry(isosig)[0]
+
+    def mcomplex(self, isosig):
+        entry = self._entry(isosig)
+        if entry[1] is None:
+            entry[1] = entry[0].mcomplex()
+        return entry[1]
+
+    def clear(self):
+        self._entries.clear()
+
+
+default_cache = TriangulationCache(
+    directory=os.environ.get('FOLIAR_TRIANGULATION_CACHE'))
+
+def compiled_triangulation(isosig):
+    """
+    The CompiledTriangulation of the given isosig, from default_cache,
+    without building an Mcomplex unless the isosig cannot be decoded.
+    """
+    return default_cache.compiled(isosig)
+
+def cached_mcomplex(isosig):
+    """
+    The Mcomplex of the given isosig, with all the tables used by the
+    orientation search already in place, from default_cache.
+
+    >>> cached_mcomplex('jLvLQAQbffghghiiieuaiikktuu') is cached_mcomplex('jLvLQAQbffghghiiieuaiikktuu')
+    True
+    """
+    return default_cache.mcomplex(isosig)
@@ -3,7 +3,7 @@ The dual cellulation to a triangulation of an oriented surface.
 """
 
 import snappy.snap.t3mlite as t3m
-from sage.all import (ZZ, matrix, vector, ChainComplex, cached_method, Graph)
+from .smith import SparseMatrix, cached_method
 
 class DualCell(object):
     """
@@ -98,7 +98,7 @@ class DualCellulation(object):
         assert list(range(V)) == sorted(v.index for v in self.vertices)
         assert list(range(E)) == sorted(e.index for e in self.edges)
         
-        D = matrix(ZZ, V, E, sparse=True)
+        D = SparseMatrix(V, E)
         for e in self.edges:
             v_init = e.vertices[0].index
             v_term = e.vertices[1].index
@@ -117,7 +117,7 @@ class DualCellulation(object):
         """
         E, F = len(self.edges), len(self.faces)
         assert list(range(E)) == sorted(e.index for e in self.edges)
-        D = matrix(ZZ, E, F, sparse=True)
+        D = SparseMatrix(E, F)
         for i, face in enumerate(self.faces):
             for edge, sign in face.edges_with_orientations:
                 D[edge.index, i] += sign
@@ -126,7 +126,8 @@ class DualCellulation(object):
 
     @cached_method
     def chain_complex(self):
-         return ChainComplex({1:self.B1(), 2:self.B2()}, degree=-1)
+         from sage.all import ChainComplex
+         return ChainComplex({1:self.B1().sage(), 2:self.B2().sage()}, degree=-1)
 
     def integral_cohomology_basis(self, dimension=1):
         assert dimension == 1
@@ -151,7 +152,7 @@ class OneCycle(object):
     def __init__(self, cellulation, weights):
         self.cellulation, self.weights = cellulation, weights
         assert sorted(edge.index for edge in cellulation.edges) == list(range(len(weights)))
-        assert cellulation.B1() * vector(weights) == 0
+        assert not any(cellulation.B1() * weights)
 
     def components(self):
         """
@@ -163,19 +164,28 @@ class OneCycle(object):
         """
         assert all(abs(w) <= 1 for w in self.weights)
         D = self.cellulation
-        G = Graph(multiedges=True)
+        edges_at = dict()
         for edge in D.edges:
             if self.weights[edge.index] != 0:
-                i, j = [v.index for v in edge.vertices]
-                G.add_edge(i, j, edge.index)
+                for v in edge.vertices:
+                    edges_at.setdefault(v.index, []).append(edge)
 
-        assert G.num_verts() == G.num_edges()
+        assert len(edges_at) == sum(len(e) for e in edges_at.values())//2
 
-        ans = []
-        for H in G.connected_components_subgraphs():
+        ans, seen = [], set()
+        for start in edges_at:
+            if start in seen:
+                continue
             weights = len(self.weights) * [0]
-            for i in H.edge_labels():
-                weights[i] = self.weights[i]
+            seen.add(start)
+            todo = [start]
+            while todo:
+                for edge in edges_at[todo.pop()]:
+                    weights[edge.index] = self.weights[edge.index]
+                    for v in edge.vertices:
+                        if v.index not in seen:
+                            seen.add(v.index)
+                            todo.append(v.index)
             ans.append(OneCycle(self.cellulation, weights))
         return ans
 
@@ -187,7 +197,7 @@ class OneCocycle(object):
     def __init__(self, cellulation, weights):
         self.cellulation, self.weights = cellulation, weights
         assert sorted(edge.index for edge in cellulation.edges) == list(range(len(weights)))
-        assert cellulation.B2().transpose() * vector(weights) == 0
+        assert not any(cellulation.B2().transpose() * weights)
 
     def __call__(self, other):
         if isinstance(other, OneCycle):
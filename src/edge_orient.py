@@ -1,10 +1,227 @@
-from . import find_orient, link, dual_cellulation, surface, peripheral, util
+# The modules for cusped manifolds, namely link, surface,
+# dual_cellulation and peripheral, are imported only where used, so
+# that work on closed manifolds does not pay for them.
+from . import find_orient, util
+from .result_cache import default_result_cache, missing
 import snappy
 import snappy.snap.t3mlite as t3m
 from snappy.snap.t3mlite.simplex import (Head, Tail,
                                          ZeroSubsimplices, OneSubsimplices,
-                                         RightFace, LeftFace)
-import networkx as nx
+                                         TwoSubsimplices, RightFace, LeftFace)
+from snappy.pari import pari
+
+# -------- Table-driven evaluation --------
+#
+# In an acyclically oriented tetrahedron, everything we need to know
+# is determined by how its six edges are oriented.  We encode this as a
+# 6-bit "pattern" where bit k is set exactly when OneSubsimplices[k]
+# runs from its Tail to its Head, and precompute the answers for all
+# 64 patterns once and for all.
+
+PatternBits = [1 << k for k in range(6)]
+
+def _pattern_data(pattern):
+    """
+    Returns a tuple (local_structure, very_long, suture_edges,
+    mixed_edges) for the given pattern.  Here local_structure maps
+    each vertex to its number of "out" and "in" arrows, very_long is
+    the very long edge (or None when the tetrahedron contains a
+    directed cycle), suture_edges are the edges where a suture crosses
+    from the RightFace to the LeftFace, and mixed_edges are those
+    contributing a mixed corner to the Euler cocycle.
+
+    >>> _pattern_data(0b111011)[:2]
+    ({1: (3, 0), 2: (2, 1), 4: (0, 3), 8: (1, 2)}, 5)
+    """
+    local = dict()
+    for a in ZeroSubsimplices:
+        out_arrows, in_arrows = 0, 0
+        for e, bit in zip(OneSubsimplices, PatternBits):
+            if a & e:
+                forward = pattern & bit != 0
+                if forward == (Tail[e] == a):
+                    out_arrows += 1
+                else:
+                    in_arrows += 1
+        local[a] = (out_arrows, in_arrows)
+
+    very_long, suture_edges, mixed_edges = None, [], []
+    for e in OneSubsimplices:
+        data = {local[Head[e]], local[Tail[e]]}
+        if all(0 in local[a] for a in [Head[e], Tail[e]]):
+            very_long = e
+        if data in [{(0, 3), (1, 2)}, {(2, 1), (3, 0)}]:
+            suture_edges.append(e)
+        if data in [{(2, 1), (0, 3)}, {(3, 0), (1, 2)}]:
+            mixed_edges.append(e)
+    return local, very_long, tuple(suture_edges), tuple(mixed_edges)
+
+LocalPatterns = [_pattern_data(p) for p in range(64)]
+
+def record_tetrahedron_tables(mcomplex):
+    """
+    For each tetrahedron, we cache in "mcomplex._tet_tables" the global
+    edges (with signs and pattern bits) needed to compute its pattern,
+    together with a 64-entry table giving, for each pattern, the
+    index of the very long edge, the pairs of faces joined by sutures,
+    and the indices of the edges with a mixed corner.  We also record
+    the indices of the ends of each edge, and whether every vertex has
+    a loop, for checking strong connectivity.
+    """
+    if not hasattr(mcomplex, '_edge_info'):
+        find_orient.record_orientations_of_edges(mcomplex)
+    tables = []
+    for tet in mcomplex.Tetrahedra:
+        index = {s: tet.Class[s].Index for s in OneSubsimplices + TwoSubsimplices}
+        tables.append(tetrahedron_table(tet.edge_info, index))
+    mcomplex._tet_tables = tables
+    mcomplex._edge_ends = [(e.Vertices[0].Index, e.Vertices[1].Index)
+                           for e in mcomplex.Edges]
+    loops = {a for a, b in mcomplex._edge_ends if a == b}
+    mcomplex._every_vertex_has_loop = len(loops) == len(mcomplex.Vertices)
+
+def tetrahedron_table(edge_info, index):
+    """
+    The entry of "_tet_tables" for a tetrahedron, given its
+    "edge_info" dict and a dict mapping each of its edges and faces
+    to the index of the corresponding global edge or face.
+    """
+    edges = tuple(edge_info[Tail[e], Head[e]] + (bit,)
+                  for e, bit in zip(OneSubsimplices, PatternBits))
+    table = []
+    for local, very_long, suture_edges, mixed_edges in LocalPatterns:
+        long_index = None if very_long is None else index[very_long]
+        sutures = tuple((index[RightFace[e]], index[LeftFace[e]])
+                        for e in suture_edges)
+        mixed = tuple(index[e] for e in mixed_edges)
+        table.append((long_index, sutures, mixed))
+    return (edges, table)
+
+def record_link_suture_tables(mcomplex):
+    """
+    For an Mcomplex from peripheral.peripheral_curve_package, we cache
+    in "mcomplex._link_suture_tables" what is needed to trace the
+    sutures on the cusp without building any cycles: for each triangle
+    of the cusp triangulation, the global edges (with signs) at its
+    corners and an 8-entry table giving, for each pattern of signs at
+    the corners, the edge of the triangle which the suture crosses and
+    the direction in which it does so; for each edge, the triangles
+    it joins; and the weights of the dual cocycles to the meridian and
+    longitude.
+    """
+    from . import surface
+    T = mcomplex.cusp_triangulation
+    D = mcomplex.cusp_dual_cellulation
+    assert [tri.index for tri in T.triangles] == list(range(len(T.triangles)))
+    corners, crossings = [], []
+    for tri in T.triangles:
+        labels = [v.index for v in tri.vertices]
+        corners.append(tuple((abs(i) - 1, 1 if i > 0 else -1) for i in labels))
+        table = []
+        for pattern in range(8):
+            signs = [1 if pattern & (1 << k) else -1 for k in range(3)]
+            if len(set(signs)) == 1:
+                table.append(None)
+                continue
+            if sorted(signs) == [-1, 1, 1]:
+                i = signs.index(-1)
+                side = surface.Side(tri, (i, (i + 1) % 3))
+            else:
+                i = signs.index(1)
+                side = surface.Side(tri, ((i - 1) % 3, i))
+            edge = side.edge()
+            # Edge and its dual have the same index
+            table.append((edge.index, edge.orientation_with_respect_to(side)))
+        crossings.append(tuple(table))
+    ends = tuple(tuple(side.triangle.index for side in edge.sides) for edge in T.edges)
+    mcomplex._link_suture_tables = (tuple(corners), tuple(crossings), ends,
+                                    D.meridian_star.weights, D.longitude_star.weights)
+
+def _reachable(neighbors, start):
+    seen = {start}
+    todo = [start]
+    while todo:
+        for b in neighbors[todo.pop()]:
+            if b not in seen:
+                seen.add(b)
+                todo.append(b)
+    return seen
+
+class CohomologyContext(object):
+    """
+    Let T be a triangulation and D be the dual cellulation.  Then the
+    boundary map C_2(D) -> C_1(D) is the transpose of the boundary map
+    C_2(T) -> C_1(T).  Which mean the coboundary map d: C^1(D) -> C^2(D)
+    is C_2(T) -> C_1(T) on the nose.  We precompute the Smith normal
+    form U d V = S so that deciding whether a 2-cocycle c is a
+    coboundary is just checking that each entry of U c is divisible
+    by the corresponding elementary divisor.
+
+    >>> N = t3m.Mcomplex('jLLvQPQcdfhghigiihshhgfifme')
+    >>> C = cohomology_context(N)
+    >>> C.divisors
+    [5, 1, 1, 1, 1, 1, 1, 1, 1, 1]
+    >>> C.is_coboundary(10*[0])
+    True
+    """
+    def __init__(self, mcomplex):
+        d = mcomplex.boundary_maps()[1].pari
+        m, n = [int(x) for x in d.matsize()]
+        U, V, S = d.matsnf(1)
+        self.num_rows = m
+        self.pari_U = U
+        self.U = [[int(U[i, j]) for j in range(m)] for i in range(m)]
+        self.divisors = []
+        for i in range(m):
+            entries = [int(S[i, j]) for j in range(n) if S[i, j] != 0]
+            self.divisors.append(entries[0] if entries else 0)
+
+    def _reduced_is_zero(self, reduced):
+        for x, div in zip(reduced, self.divisors):
+            if (x != 0) if div == 0 else (x % div != 0):
+                return False
+        return True
+
+    def is_coboundary(self, cocycle):
+        reduced = [sum(a*b for a, b in zip(row, cocycle)) for row in self.U]
+        return self._reduced_is_zero(reduced)
+
+    def are_coboundaries(self, cocycles):
+        """
+        Tests all the given cocycles at once by stacking them as the
+        columns of a single matrix.
+        """
+        k = len(cocycles)
+        if k == 0:
+            return []
+        m = self.num_rows
+        C = pari.matrix(k, m, [x for c in cocycles for x in c]).mattranspose()
+        W = self.pari_U * C
+        return [self._reduced_is_zero([int(W[i, j]) for i in range(m)])
+                for j in range(k)]
+
+def cohomology_context(mcomplex):
+    if not hasattr(mcomplex, '_cohomology_context'):
+        mcomplex._cohomology_context = CohomologyContext(mcomplex)
+    return mcomplex._cohomology_context
+
+def euler_classes_vanish(orientations):
+    """
+    For EdgeOrientations of a common one-vertex triangulation giving
+    foliations, returns whether each Euler class vanishes.
+
+    >>> T = t3m.Mcomplex('tLLLLMLLwPMQPkacfihjinmlpmoqrpsrssjkgqqthqkwtvxofsqcaa')
+    >>> foliations = list(foliar_orientations(T))
+    >>> euler_classes_vanish(foliations) == [eo.euler_class_vanishes() for eo in foliations]
+    True
+    """
+    if len(orientations) == 0:
+        return []
+    M = orientations[0].mcomplex
+    assert len(M.Vertices) == 1
+    assert all(eo.mcomplex is M for eo in orientations)
+    cocycles = [eo.euler_cocycle() for eo in orientations]
+    return cohomology_context(M).are_coboundaries(cocycles)
 
 class EdgeOrientation(object):
     """
@@ -64,51 +281,96 @@ class EdgeOrientation(object):
     >>> len(orients), len(foliations)
     (202, 116)
     """
+    __slots__ = ('mcomplex', '_bits', '_patterns')
+
     def __init__(self, mcomplex, signs, check=True):
-        self.mcomplex, self.signs = mcomplex, signs
+        self.mcomplex = mcomplex
+        self._set_signs(signs)
         if not all(v.link_genus()==0 for v in mcomplex.Vertices):
             raise ValueError('Some vertex link is not a sphere')
         if check:
             self._check_acyclic()
-        self._setup_local_structure()
-        
+
+    def _set_signs(self, signs):
+        """
+        The signs are stored as a single integer whose ith bit is set
+        exactly when the ith edge has sign +1, and the patterns are
+        only computed when first needed.
+        """
+        bits = 0
+        for i, s in enumerate(signs):
+            if s > 0:
+                bits |= 1 << i
+        self._bits = bits
+        self._patterns = None
+        if not hasattr(self.mcomplex, '_tet_tables'):
+            record_tetrahedron_tables(self.mcomplex)
+
+    @property
+    def signs(self):
+        """
+        >>> N = t3m.Mcomplex('jLvLQAQbffghghiiieuaiikktuu')
+        >>> eo = next(edge_orientations(N))
+        >>> eo.signs
+        [1, -1, 1, -1, -1, 1, -1, -1, 1, 1]
+        >>> hasattr(eo, '__dict__')
+        False
+        """
+        bits = self._bits
+        return [1 if bits >> i & 1 else -1
+                for i in range(len(self.mcomplex.Edges))]
 
     def _check_acyclic(self):
+        signs = self.signs
         for face in find_orient.oriented_edges_around_faces(self.mcomplex):
             face_signs = []
             for e in face:
                 s = 1 if e > 0 else -1
-                face_signs.append(s*self.signs[abs(e) - 1])
+                face_signs.append(s*signs[abs(e) - 1])
             if face_signs in ([1, 1, 1], [-1, -1, -1]):
                 raise ValueError('EdgeOrientation is not acyclic')
 
-    def _setup_local_structure(self):
+    @property
+    def patterns(self):
         """
-        The "local_structure[tet, vertex]" attribute records the number of
-        "out" and "in" arrows of the vertex in the given tetrahedra.
+        How the edges of each tetrahedron are oriented, as a bytes
+        object whose entry tet.Index is an index into LocalPatterns.
         """
+        if self._patterns is None:
+            M, bits = self.mcomplex, self._bits
+            patterns = bytearray(len(M._tet_tables))
+            for t, (edges, table) in enumerate(M._tet_tables):
+                pattern = 0
+                for edge, sign, bit in edges:
+                    if (sign > 0) == (bits >> edge & 1 == 1):
+                        pattern |= bit
+                patterns[t] = pattern
+            self._patterns = bytes(patterns)
+        return self._patterns
 
-        self.local_structure = local_structure = dict()
+    @property
+    def local_structure(self):
+        """
+        The number of "out" and "in" arrows of each vertex in the given
+        tetrahedron, as a dict keyed by (tet, vertex).
+        """
+        ans = dict()
         for tet in self.mcomplex.Tetrahedra:
+            local = LocalPatterns[self.patterns[tet.Index]][0]
             for a in ZeroSubsimplices:
-                out_arrows, in_arrows = 0, 0
-                for (edge, sign) in tet.edge_info[a]:
-                    if sign * self.signs[edge] > 0:
-                        out_arrows += 1
-                    else:
-                        in_arrows += 1
-                local_structure[tet, a] = (out_arrows, in_arrows)
+                ans[tet, a] = local[a]
+        return ans
 
     def __call__(self, edge):
         """
         Return the sign self assigns to the given edge.
         """
-        return self.signs[edge.Index]
+        return 1 if self._bits >> edge.Index & 1 else -1
 
 
     def local_structure_edge(self, tet, edge):
-        loc_str = self.local_structure
-        return {loc_str[tet, Head[edge]], loc_str[tet, Tail[edge]]}
+        local = LocalPatterns[self.patterns[tet.Index]][0]
+        return {local[Head[edge]], local[Tail[edge]]}
 
     def is_very_long(self, tet_or_corner, edge=None):
         if edge is None:  # Called with a corner
@@ -117,11 +379,8 @@ class EdgeOrientation(object):
         else:
             tet = tet_or_corner
 
-        for a in [Head[edge], Tail[edge]]:
-            if 0 not in self.local_structure[tet, a]:
-                return False
-        return True
-                        
+        return LocalPatterns[self.patterns[tet.Index]][1] == edge
+
     def has_sink_edge(self):
         """
         In an acyclically oriented tetrahedron, the unique edge that runs
@@ -133,17 +392,21 @@ class EdgeOrientation(object):
         return self.num_sink_edges() > 0
 
     def num_sink_edges(self):
-        ans = 0
-        for edge in self.mcomplex.Edges:
-            if all(self.is_very_long(c) for c in edge.Corners):
-                ans += 1
-        return ans
+        M = self.mcomplex
+        very_long = len(M.Edges) * [0]
+        for pattern, (edges, table) in zip(self.patterns, M._tet_tables):
+            edge = table[pattern][0]
+            if edge is not None:
+                very_long[edge] += 1
+        return sum(1 for edge in M.Edges
+                   if very_long[edge.Index] == len(edge.Corners))
 
     def one_skeleton_digraph(self):
         """
         Returns the 1-skeleton of the ambient 3-manifold triangulation
         oriented via self.
         """
+        import networkx as nx
         T = self.mcomplex
         G = nx.DiGraph()
         G.add_nodes_from(T.Vertices)
@@ -154,6 +417,32 @@ class EdgeOrientation(object):
             G.add_edge(a, b)
         return G
             
+    def _directed_cut(self):
+        """
+        Returns None if the 1-skeleton is strongly connected as a
+        digraph.  Otherwise, returns a set S of vertex indices such
+        that every edge between S and its complement points the same
+        way.
+        """
+        M = self.mcomplex
+        n = len(M.Vertices)
+        if n == 1:
+            return None
+        out_arrows = [[] for i in range(n)]
+        in_arrows = [[] for i in range(n)]
+        bits = self._bits
+        for i, (a, b) in enumerate(M._edge_ends):
+            if not bits >> i & 1:
+                a, b = b, a
+            if a != b:
+                out_arrows[a].append(b)
+                in_arrows[b].append(a)
+        for arrows in [out_arrows, in_arrows]:
+            S = _reachable(arrows, 0)
+            if len(S) < n:
+                return S
+        return None
+
     def strongly_connected(self):
         """
         An EdgeOrientation is strongly connected if the 1-skeleton is
@@ -161,9 +450,8 @@ class EdgeOrientation(object):
         reached from any other via a directed path) *and* every vertex
         has a loop.
         """
-        G = self.one_skeleton_digraph()
-        return (nx.number_strongly_connected_components(G) == 1 and 
-                len(list(nx.nodes_with_selfloops(G))) == G.number_of_nodes())
+        return (self.mcomplex._every_vertex_has_loop and
+                self._directed_cut() is None)
 
     def euler_cocycle(self):
         """
@@ -171,50 +459,123 @@ class EdgeOrientation(object):
         standard cocycle representing the Euler class evaluated on the
         dual face to the given edge.
         """
-        cocycle = []
-        for edge in self.mcomplex.Edges:
-            mixed_count = 0
-            for c in edge.Corners:
-                tet = c.Tetrahedron
-                e = c.Subsimplex
-                data = {self.local_structure[tet, v] for v in [Head[e], Tail[e]]}
-                if data in [{(2, 1), (0, 3)}, {(3, 0), (1, 2)}]:
-                    mixed_count += 1
-
-            assert mixed_count % 2 == 0
-            val = -mixed_count//2 + 1
-            cocycle.append(val * self.signs[edge.Index])
+        M = self.mcomplex
+        mixed_count = len(M.Edges) * [0]
+        for pattern, (edges, table) in zip(self.patterns, M._tet_tables):
+            for edge in table[pattern][2]:
+                mixed_count[edge] += 1
+
+        cocycle, signs = [], self.signs
+        for edge in M.Edges:
+            count = mixed_count[edge.Index]
+            assert count % 2 == 0
+            val = -count//2 + 1
+            cocycle.append(val * signs[edge.Index])
         return cocycle
 
     def euler_class_vanishes(self):
-        # Let T be self.mcomplex and D be the dual cellulation.  Then
-        # the boundary map C_2(D) -> C_1(D) is the transpose of the
-        # boundary map C_2(T) -> C_1(T).  Which mean the coboundary map
-        # C^1(D) -> C^2(D) is C_2(T) -> C_1(T) on the nose.
         assert len(self.mcomplex.Vertices) == 1
-        d = self.mcomplex.boundary_maps()[1]
-        cohomology_elem_div = d.pari.matsnf(flag=4)
-        euler = t3m.linalg.Vector(self.euler_cocycle()).pari.Col()
-        elem_div_after_quot_by_euler = d.pari.concat(euler).matsnf(flag=4)
-        return cohomology_elem_div == elem_div_after_quot_by_euler
+        context = cohomology_context(self.mcomplex)
+        return context.is_coboundary(self.euler_cocycle())
 
-    def num_sutures(self):
+    def _suture_roots(self):
+        """
+        Union-find on the faces of the triangulation, joining those
+        connected by a suture.  Returns the root of each face.
+        """
         M = self.mcomplex
-        G = nx.Graph()
-        for tet in M.Tetrahedra:
-            for e in OneSubsimplices:
-                if self.local_structure_edge(tet, e) in [{(0,3), (1,2)}, {(2,1), (3,0)}]:
-                    i = tet.Class[RightFace[e]].Index
-                    j = tet.Class[LeftFace[e]].Index
-                    G.add_edge(i,j)
-        assert G.number_of_nodes() == len(M.Faces)
-        return nx.number_connected_components(G)
+        num_faces = len(M.Faces)
+        parent = list(range(num_faces))
+        touched = bytearray(num_faces)
+        for pattern, (edges, table) in zip(self.patterns, M._tet_tables):
+            for i, j in table[pattern][1]:
+                touched[i] = touched[j] = 1
+                while parent[i] != i:
+                    parent[i] = i = parent[parent[i]]
+                while parent[j] != j:
+                    parent[j] = j = parent[parent[j]]
+                if i != j:
+                    parent[i] = j
+        assert all(touched)
+        roots = []
+        for i in range(num_faces):
+            while parent[i] != i:
+                i = parent[i]
+            roots.append(i)
+        return roots
+
+    def num_sutures(self):
+        return len(set(self._suture_roots()))
 
     def gives_foliation(self):
         return (not self.has_sink_edge()
                 and self.num_sutures() == len(self.mcomplex.Vertices)
                 and self.strongly_connected())
 
+    def _true_literal(self, tet, a, b):
+        """
+        The literal, in the variables of find_orient.orientation_clauses,
+        recording how self orients the edge of tet from a to b.
+        """
+        lit = find_orient.arrow_literal(tet, a, b)
+        positive = self._bits >> (abs(lit) - 1) & 1
+        return lit if (lit > 0) == bool(positive) else -lit
+
+    def failure_clause(self):
+        """
+        Returns None if self gives a foliation.  Otherwise, returns a
+        clause which self violates but which is satisfied by every
+        orientation giving a foliation, preferably a short one
+        recording the cause of the failure:
+
+        * For a sink edge, the arrows making it very long in each
+          corner.
+
+        * When the 1-skeleton is not strongly connected, the edges
+          between the vertices reachable from (or reaching) some vertex
+          and the rest, all of which point the same way.
+
+        * For a one-vertex triangulation with too many sutures, the
+          edges of the tetrahedra meeting the faces of the smallest
+          suture component, which already separate it off.
+
+        The empty clause means no orientation works at all.
+        """
+        M, signs = self.mcomplex, self.signs
+        for edge in M.Edges:
+            if all(self.is_very_long(c) for c in edge.Corners):
+                clause = set()
+                for corner in edge.Corners:
+                    tet, e = corner.Tetrahedron, corner.Subsimplex
+                    for a in [Head[e], Tail[e]]:
+                        for b in ZeroSubsimplices:
+                            if a != b:
+                                clause.add(-self._true_literal(tet, a, b))
+                return sorted(clause, key=abs)
+
+        if not M._every_vertex_has_loop:
+            return []
+        S = self._directed_cut()
+        if S is not None:
+            return [-signs[i] * (i + 1) for i, (a, b) in enumerate(M._edge_ends)
+                    if (a in S) != (b in S)]
+
+        roots = self._suture_roots()
+        if len(set(roots)) == len(M.Vertices):
+            return None
+        if len(M.Vertices) == 1:
+            components = dict()
+            for i, root in enumerate(roots):
+                components.setdefault(root, []).append(i)
+            smallest = min(components.values(), key=len)
+            edges = set()
+            for i in smallest:
+                for corner in M.Faces[i].Corners:
+                    edges.update(edge for edge, sign, bit in
+                                 M._tet_tables[corner.Tetrahedron.Index][0])
+            return [-signs[e]*(e + 1) for e in sorted(edges)]
+        return [-s*(i + 1) for i, s in enumerate(signs)]
+
 class IdealEdgeOrientation(EdgeOrientation):
     """
     An orientation on the edges of an ideal triangulation of a
@@ -232,25 +593,40 @@ class IdealEdgeOrientation(EdgeOrientation):
     laminar.  In this case, every Dehn filling except along the
     degeneracy slope gives a manifold with a co-orientable taut
     foliation.
+
+    The mcomplex must come from peripheral.peripheral_curve_package,
+    and the signs refer to its edges.  When that package is cached, as
+    it is for edge_orientations, both it and self.triangulation are
+    the canonical retriangulation with the same decorated isosig, not
+    the manifold originally passed in, whose edges may be labelled
+    differently.
     """
+    __slots__ = ('triangulation', 'vertex_link', 'link_dual_cellulation',
+                 '_link_vertex_signs')
+
     def __init__(self, mcomplex, signs):
         self.triangulation = T = mcomplex.original_triangulation
-        self.signs = signs
         self.mcomplex = mcomplex
+        self._set_signs(signs)
         self.vertex_link = mcomplex.cusp_triangulation
         self.link_dual_cellulation = mcomplex.cusp_dual_cellulation
         assert len(self.mcomplex.Vertices) == 1
         assert self.mcomplex.Vertices[0].link_genus() == 1
-        self._setup_local_structure()
-        self._add_link_vertex_signs()
+        self._link_vertex_signs = None
+        if not hasattr(mcomplex, '_link_suture_tables'):
+            record_link_suture_tables(mcomplex)
 
-    def _add_link_vertex_signs(self):
-        self.link_vertex_signs = dict()
-        for vert in self.vertex_link.vertices:
-            i = vert.index
-            edge_sign = self.signs[abs(i) - 1]
-            vert_sign = 1 if edge_sign*i > 0 else -1
-            self.link_vertex_signs[vert] = vert_sign
+    @property
+    def link_vertex_signs(self):
+        if self._link_vertex_signs is None:
+            self._link_vertex_signs = dict()
+            signs = self.signs
+            for vert in self.vertex_link.vertices:
+                i = vert.index
+                edge_sign = signs[abs(i) - 1]
+                vert_sign = 1 if edge_sign*i > 0 else -1
+                self._link_vertex_signs[vert] = vert_sign
+        return self._link_vertex_signs
 
     def link_subgraphs(self):
         pos, neg = [], []
@@ -263,6 +639,52 @@ class IdealEdgeOrientation(EdgeOrientation):
         G = self.vertex_link.edge_graph()
         return G.subgraph(vertices=pos), G.subgraph(vertices=neg)
 
+    def _suture_components(self):
+        """
+        The sutures on the cusp, each as a dict taking the index of
+        each edge of the dual cellulation that it crosses to its
+        weight, found by union-find on the triangles of the cusp
+        using "_link_suture_tables".
+        """
+        corners, crossings, ends, mstar, lstar = self.mcomplex._link_suture_tables
+        signs = self.signs
+        parent = list(range(len(corners)))
+        weights = dict()
+        for ((e0, s0), (e1, s1), (e2, s2)), table in zip(corners, crossings):
+            pattern = ((signs[e0]*s0 > 0) | (signs[e1]*s1 > 0) << 1 |
+                       (signs[e2]*s2 > 0) << 2)
+            crossing = table[pattern]
+            if crossing is not None:
+                edge, weight = crossing
+                weights[edge] = weight
+                i, j = ends[edge]
+                while parent[i] != i:
+                    parent[i] = i = parent[parent[i]]
+                while parent[j] != j:
+                    parent[j] = j = parent[parent[j]]
+                if i != j:
+                    parent[i] = j
+        components = dict()
+        for edge in sorted(weights):
+            i = ends[edge][0]
+            while parent[i] != i:
+                i = parent[i]
+            components.setdefault(i, dict())[edge] = weights[edge]
+        return list(components.values())
+
+    def _suture_slopes(self):
+        """
+        >>> M = snappy.Triangulation('m015')
+        >>> eo = next(edge_orientations(M))
+        >>> D = eo.link_dual_cellulation
+        >>> eo._suture_slopes() == [D.slope(suture) for suture in eo.sutures()]
+        True
+        """
+        corners, crossings, ends, mstar, lstar = self.mcomplex._link_suture_tables
+        return [(sum(w*mstar[e] for e, w in component.items()),
+                 sum(w*lstar[e] for e, w in component.items()))
+                for component in self._suture_components()]
+
     def sutures(self):
         """
         Returns a list of cycles on the 1-skeleton of the dual cellulation
@@ -274,32 +696,20 @@ class IdealEdgeOrientation(EdgeOrientation):
         >>> len([eo.sutures() for eo in orients])
         2
         """
-        T = self.vertex_link
+        from . import dual_cellulation
         D = self.link_dual_cellulation
-        weights = len(T.edges) * [0]
-        for tri in T.triangles:
-            signs = [self.link_vertex_signs[v] for v in tri.vertices]
-            if len(set(signs)) > 1:
-                if sorted(signs) == [-1, 1, 1]:
-                    i = signs.index(-1)
-                    j = (i + 1) % 3
-                    side = surface.Side(tri, (i, j))
-                else:
-                    assert sorted(signs) == [-1, -1, 1]
-                    i = signs.index(1)
-                    j = (i - 1) % 3
-                    side = surface.Side(tri, (j, i))
-                edge = side.edge()
-                sign = edge.orientation_with_respect_to(side)
-                # Edge and its dual have the same index
-                weights[edge.index] = sign
-        return dual_cellulation.OneCycle(D, weights).components()
-                
+        ans = []
+        for component in self._suture_components():
+            weights = len(D.edges) * [0]
+            for edge, weight in component.items():
+                weights[edge] = weight
+            ans.append(dual_cellulation.OneCycle(D, weights))
+        return ans
+
     def link_compatible_with_foliation(self):
-        sutures = self.sutures()
-        assert len(sutures) % 2 == 0
-        D = self.link_dual_cellulation
-        return all(D.slope(suture) != 0 for suture in sutures)
+        slopes = self._suture_slopes()
+        assert len(slopes) % 2 == 0
+        return all(slope != (0, 0) for slope in slopes)
 
     def gives_foliation(self):
         if self.has_sink_edge():
@@ -316,25 +726,253 @@ class IdealEdgeOrientation(EdgeOrientation):
         [(1, 0), (1, 0)]
         """
         assert self.gives_foliation()
-        suture = self.sutures()[0]
-        a, b = self.link_dual_cellulation.slope(suture)
-        if a*b == 0:
-            a, b = abs(a), abs(b)
-        elif b < 0:
-            a, b = -a, -b
-        return (a, b) 
-
-def edge_orientations(manifold):
+        return normalize_slope(self._suture_slopes()[0])
+
+def normalize_slope(slope):
+    """
+    The representative of the slope, up to sign, used for degeneracy
+    slopes, so that slopes can be compared.
+
+    >>> normalize_slope((-1, -2)), normalize_slope((3, -1)), normalize_slope((0, -1))
+    ((1, 2), (-3, 1), (0, 1))
+    """
+    a, b = slope
+    if a*b == 0:
+        a, b = abs(a), abs(b)
+    elif b < 0:
+        a, b = -a, -b
+    return (a, b)
+
+def edge_orientations(manifold, no_sink_edges=False, symmetry=False, workers=None):
+    """
+    Iterates over the acyclic edge orientations of the given
+    triangulation, which for a cusped manifold is first replaced by
+    its canonical retriangulation; see IdealEdgeOrientation.  If
+    no_sink_edges is set, orientations with a sink edge are excluded
+    already at the level of the SAT solver.  For a closed
+    triangulation, symmetry restricts to one orientation in each orbit
+    of its automorphism group.  With more than one worker,
+    the SAT problem is split into cubes solved in parallel; see
+    find_orient.cycle_free_orientations_cubes.
+
+    >>> N = t3m.Mcomplex('jLvLQAQbffghghiiieuaiikktuu')
+    >>> len(list(edge_orientations(N))), len(list(edge_orientations(N, True)))
+    (10, 9)
+    >>> N = t3m.Mcomplex('lLLvMMMQccdfghhikkjjkhsawrksqqmdw')
+    >>> len(list(edge_orientations(N))), len(list(edge_orientations(N, symmetry=True)))
+    (8, 4)
+    """
     if isinstance(manifold, t3m.Mcomplex):  # closed manifold
         N = manifold
-        for signs in find_orient.cycle_free_orientations(N):
+        orients = find_orient.cycle_free_orientations(N, no_sink_edges=no_sink_edges,
+                                                      symmetry=symmetry,
+                                                      workers=workers)
+        for signs in orients:
             yield EdgeOrientation(N, signs, check=False)
     else: # 1-cusped manifold
+        # Automorphisms can move the peripheral curves, so symmetry
+        # breaking is not used here.  The orientations are of the
+        # canonical retriangulation with the same decorated isosig, see
+        # peripheral.peripheral_curve_package, so their signs need not
+        # match the edges of the given triangulation.
+        from . import peripheral
         N = peripheral.peripheral_curve_package(manifold)[0]
         assert len(N.Vertices) == 1 and N.Vertices[0].link_genus() == 1
-        for signs in find_orient.cycle_free_orientations(N):
+        orients = find_orient.cycle_free_orientations(N, no_sink_edges=no_sink_edges,
+                                                      workers=workers)
+        for signs in orients:
             yield IdealEdgeOrientation(N, signs)
 
+def foliar_orientations(mcomplex, symmetry=False, guided=None):
+    """
+    Iterates over the orientations of the given closed triangulation
+    which give foliations.  With symmetry, only one orientation in
+    each orbit of the automorphism group is returned.
+
+    By default, the orientations without sink edges are enumerated by
+    pycosat and filtered.  If guided is the name of a backend in
+    sat_backends, find_orient.guided_orientations is used instead, so
+    that each failing orientation rules out all those failing for the
+    same reason.  As this re-solves after every clause learned, it
+    only pays off with an incremental backend such as 'cadical', and
+    even then mostly when looking for the first foliar orientation.
+
+    >>> T = t3m.Mcomplex('tLLLLMLLwPMQPkacfihjinmlpmoqrpsrssjkgqqthqkwtvxofsqcaa')
+    >>> len(list(foliar_orientations(T))), len(list(foliar_orientations(T, guided='picosat')))
+    (30, 30)
+    >>> R = t3m.Mcomplex('nLLLwAPLQkcdefhhihklmlmmhsdarkdjselaxj')
+    >>> list(foliar_orientations(R)), list(foliar_orientations(R, guided='picosat'))
+    ([], [])
+    """
+    if guided is None:
+        for eo in edge_orientations(mcomplex, no_sink_edges=True, symmetry=symmetry):
+            if eo.gives_foliation():
+                yield eo
+        return
+
+    def explain(signs):
+        return EdgeOrientation(mcomplex, signs, check=False).failure_clause()
+
+    for signs in find_orient.guided_orientations(mcomplex, explain, symmetry=symmetry,
+                                                 method=guided):
+        yield EdgeOrientation(mcomplex, signs, check=False)
+
+# -------- Batch evaluation with NumPy --------
+
+def _incidence_arrays(mcomplex):
+    """
+    NumPy versions of the tables from record_tetrahedron_tables,
+    padded with -1, cached on the Mcomplex.
+    """
+    import numpy as np
+    if hasattr(mcomplex, '_incidence_arrays'):
+        return mcomplex._incidence_arrays
+    if not hasattr(mcomplex, '_tet_tables'):
+        record_tetrahedron_tables(mcomplex)
+    tables = mcomplex._tet_tables
+    T = len(tables)
+    max_sutures = max(len(entry[1]) for edges, table in tables for entry in table)
+    max_mixed = max(len(entry[2]) for edges, table in tables for entry in table)
+    tet_edges = np.array([[edge for edge, sign, bit in edges] for edges, table in tables])
+    tet_signs = np.array([[sign for edge, sign, bit in edges] for edges, table in tables])
+    very_long = -np.ones((T, 64), dtype=int)
+    sutures = -np.ones((T, 64, max(max_sutures, 1), 2), dtype=int)
+    mixed = -np.ones((T, 64, max(max_mixed, 1)), dtype=int)
+    for t, (edges, table) in enumerate(tables):
+        for p, (long_index, suture_pairs, mixed_edges) in enumerate(table):
+            if long_index is not None:
+                very_long[t, p] = long_index
+            for k, pair in enumerate(suture_pairs):
+                sutures[t, p, k] = pair
+            for k, edge in enumerate(mixed_edges):
+                mixed[t, p, k] = edge
+    valences = np.array([len(edge.Corners) for edge in mcomplex.Edges])
+    ans = (tet_edges, tet_signs, very_long, sutures, mixed, valences)
+    mcomplex._incidence_arrays = ans
+    return ans
+
+def _count_rows(num_rows, num_cols, rows, cols):
+    """
+    counts[i, j] is the number of k with rows[k] == i and cols[k] == j;
+    entries where cols is -1 are skipped.
+    """
+    import numpy as np
+    keep = cols >= 0
+    flat = rows[keep] * num_cols + cols[keep]
+    counts = np.bincount(flat, minlength=num_rows * num_cols)
+    return counts.reshape(num_rows, num_cols)
+
+def evaluate_orientations(mcomplex, signs_matrix):
+    """
+    Evaluates many acyclic orientations of a closed triangulation at
+    once, given as the rows of an (orientations x edges) array of 1's
+    and -1's.  Returns a dict of arrays, with one entry per row, for
+    the keys 'has_sink_edge', 'num_sutures', 'strongly_connected',
+    'gives_foliation' and 'euler_cocycle'; the last is only meaningful
+    in rows that give foliations.
+
+    >>> T = t3m.Mcomplex('tLLLLMLLwPMQPkacfihjinmlpmoqrpsrssjkgqqthqkwtvxofsqcaa')
+    >>> signs = list(find_orient.cycle_free_orientations(T))
+    >>> ans = evaluate_orientations(T, signs)
+    >>> len(signs), int(ans['gives_foliation'].sum())
+    (55, 30)
+    """
+    import numpy as np
+    M = mcomplex
+    tet_edges, tet_signs, very_long, sutures, mixed, valences = _incidence_arrays(M)
+    S = np.asarray(signs_matrix, dtype=np.int8)
+    N, E = S.shape
+    T = len(M.Tetrahedra)
+    F = len(M.Faces)
+    V = len(M.Vertices)
+    rows = np.arange(N)
+
+    # The pattern of each tetrahedron in each orientation.
+    forward = S[:, tet_edges] * tet_signs > 0
+    patterns = (forward << np.arange(6)).sum(axis=2)
+    tets = np.arange(T)
+
+    # Sink edges
+    long_edges = very_long[tets, patterns]
+    long_counts = _count_rows(N, E, np.repeat(rows, T), long_edges.ravel())
+    has_sink_edge = (long_counts == valences).any(axis=1)
+
+    # Euler cocycle
+    mixed_edges = mixed[tets, patterns].reshape(N, -1)
+    k = mixed_edges.shape[1]
+    mixed_counts = _count_rows(N, E, np.repeat(rows, k), mixed_edges.ravel())
+    euler_cocycle = (1 - mixed_counts // 2) * S
+
+    # Sutures, by Shiloach-Vishkin style hooking: each suture joining
+    # two trees hangs the larger root under the smaller, then paths
+    # are compressed, until no suture joins distinct trees.  Faces
+    # are numbered row*F + index, so all rows are done at once.
+    pairs = sutures[tets, patterns].reshape(N, -1, 2)
+    present = pairs[:, :, 0] >= 0
+    pair_rows = np.broadcast_to(rows[:, None], present.shape)[present]
+    i = pair_rows * F + pairs[:, :, 0][present]
+    j = pair_rows * F + pairs[:, :, 1][present]
+    labels = np.arange(N * F)
+    while True:
+        li, lj = labels[i], labels[j]
+        differ = li != lj
+        if not differ.any():
+            break
+        i, j, li, lj = i[differ], j[differ], li[differ], lj[differ]
+        high, low = np.maximum(li, lj), np.minimum(li, lj)
+        order = np.lexsort((low, high))
+        high, low = high[order], low[order]
+        first = np.r_[True, high[1:] != high[:-1]]
+        high, low = high[first], low[first]
+        labels[high] = np.minimum(labels[high], low)
+        while True:
+            new = labels[labels]
+            if (new == labels).all():
+                break
+            labels = new
+    num_sutures = (labels == np.arange(N * F)).reshape(N, F).sum(axis=1)
+
+    # Strong connectivity via the transitive closure of the 1-skeleton
+    if not M._every_vertex_has_loop:
+        strongly_connected = np.zeros(N, dtype=bool)
+    elif V == 1:
+        strongly_connected = np.ones(N, dtype=bool)
+    else:
+        ends = np.array(M._edge_ends)
+        tail = np.where(S > 0, ends[:, 0], ends[:, 1])
+        head = np.where(S > 0, ends[:, 1], ends[:, 0])
+        reach = np.zeros((N, V, V), dtype=bool)
+        reach[np.repeat(rows, E), tail.ravel(), head.ravel()] = True
+        reach[:, np.arange(V), np.arange(V)] = True
+        for step in range(V.bit_length()):
+            reach = np.matmul(reach.astype(np.int32), reach.astype(np.int32)) > 0
+        strongly_connected = reach.all(axis=(1, 2))
+
+    gives_foliation = ~has_sink_edge & (num_sutures == V) & strongly_connected
+    return {'has_sink_edge': has_sink_edge,
+            'num_sutures': num_sutures,
+            'strongly_connected': strongly_connected,
+            'gives_foliation': gives_foliation,
+            'euler_cocycle': euler_cocycle}
+
+def batch_foliar_orientations(mcomplex, signs_matrix):
+    """
+    The EdgeOrientations giving foliations among the rows of
+    signs_matrix, found with evaluate_orientations, so only these
+    survivors are built as Python objects.
+
+    >>> Z = t3m.Mcomplex('sLLLvLLLQAPQQcdghmljnpmlrqoqoprrhshvxuulhrrptftvgpk')
+    >>> len(batch_foliar_orientations(Z, list(find_orient.cycle_free_orientations(Z))))
+    116
+    """
+    import numpy as np
+    S = np.asarray(signs_matrix, dtype=np.int8)
+    if len(S) == 0:
+        return []
+    good = evaluate_orientations(mcomplex, S)['gives_foliation']
+    return [EdgeOrientation(mcomplex, [int(s) for s in S[i]], check=False)
+            for i in np.flatnonzero(good)]
+
 def degeneracy_slopes(manifold):
     """
     Finds all persistently foliar orientations on the given
@@ -346,11 +984,20 @@ def degeneracy_slopes(manifold):
     [(1, 0)]
     """
     M = snappy.Triangulation(manifold)
+    cache = default_result_cache()
+    if cache is not None:
+        iso = M.triangulation_isosig()
+        slopes = cache.get(iso, 'degeneracy_slopes', missing)
+        if slopes is not missing:
+            return [tuple(slope) for slope in slopes]
     degeneracy_slopes = []
-    for eo in edge_orientations(M):
+    for eo in edge_orientations(M, no_sink_edges=True):
         if eo.gives_foliation():
             degeneracy_slopes.append(eo.degeneracy_slope())
-    return sorted(set(degeneracy_slopes))
+    degeneracy_slopes = sorted(set(degeneracy_slopes))
+    if cache is not None:
+        cache.set(iso, 'degeneracy_slopes', degeneracy_slopes)
+    return degeneracy_slopes
 
 def degeneracy_slopes_with_search(manifold, tries=1000):
     """
@@ -360,7 +1007,7 @@ def degeneracy_slopes_with_search(manifold, tries=1000):
     manifold = snappy.Triangulation(manifold)
     slopes, triangulations = list(), list()
     for M in util.cusped_triangulations(manifold, tries):
-        for eo in edge_orientations(M):
+        for eo in edge_orientations(M, no_sink_edges=True):
             if eo.gives_foliation():
                 slope = eo.degeneracy_slope()
                 if slope not in slopes:
@@ -381,7 +1028,7 @@ def test_cusped(n=100, tries=1000, progress=True):
 
 def has_taut_fol_with_euler_0(spec):
     N = t3m.Mcomplex(spec)
-    orients = edge_orientations(N)
+    orients = edge_orientations(N, no_sink_edges=True)
     good = [eo for eo in orients if eo.gives_foliation()]
     return any(eo.euler_class_vanishes() for eo in good)
 
@@ -394,7 +1041,7 @@ def search_for_persistent(manifold, tries=10):
     manifold = snappy.Triangulation(manifold)
     slopes, triangulations = list(), list()
     for M in util.cusped_triangulations(manifold, tries):
-        for eo in edge_orientations(M):
+        for eo in edge_orientations(M, no_sink_edges=True):
             if eo.gives_foliation():
                 return eo
 
@@ -405,9 +1052,27 @@ def is_persistent_tri(manifold):
     True
     """
     M = snappy.Triangulation(manifold)
-    for eo in edge_orientations(M):
-        if eo.gives_foliation():
-            return eo
+    cache = default_result_cache()
+    if cache is None:
+        for eo in edge_orientations(M, no_sink_edges=True):
+            if eo.gives_foliation():
+                return eo
+        return None
+
+    # The cached signs refer to the canonical labelling of M.
+    iso = M.triangulation_isosig()
+    M = snappy.Triangulation(iso)
+    signs = cache.get(iso, 'persistent_orientation', missing)
+    if signs is missing:
+        for eo in edge_orientations(M, no_sink_edges=True):
+            if eo.gives_foliation():
+                cache.set(iso, 'persistent_orientation', eo.signs)
+                return eo
+        cache.set(iso, 'persistent_orientation', None)
+    elif signs is not None:
+        from . import peripheral
+        N = peripheral.peripheral_curve_package(M)[0]
+        return IdealEdgeOrientation(N, signs)
 
 if __name__ == '__main__':
     import doctest
@@ -5,12 +5,19 @@ the one-skeleton where no triangular face is a directed cycle.
 You need to have either the "pycosat" Python package or Sage's
 interface to "cryptominisat" installed. I recommend the former since
 it's much easier to install.  There is also "pylgl" which I didn't
-try.
+try.  Further backends, such as CaDiCaL via "python-sat", are
+available through sat_backends.
 
 """
 
 import snappy.snap.t3mlite as t3m
 from snappy.snap.t3mlite.simplex import *
+from snappy.snap.t3mlite.perm4 import Perm4, inv
+import itertools
+import multiprocessing
+import random
+import time
+from . import sat_backends
 
 
 # -------- t3m preliminaries --------
@@ -53,18 +60,250 @@ def record_orientations_of_edges(triangulation):
 
 
 def oriented_edges_around_faces(triangulation):
+    """
+    For each face of each tetrahedron, the literals of its three edges
+    going around it anticlockwise.  Cached as "_face_cycles", so a
+    fresh copy is returned each time.
+    """
+    if not hasattr(triangulation, '_face_cycles'):
+        if not hasattr(triangulation, '_edge_info'):
+            record_orientations_of_edges(triangulation)
+        ans = []
+        for tet in triangulation.Tetrahedra:
+            for vertices in VerticesOfFace.values():
+                face = []
+                for i in range(3):
+                    a, b = vertices[i], vertices[(i+1)%3]
+                    edge, sign = tet.edge_info[a, b]
+                    face.append(sign*(edge + 1))
+                ans.append(tuple(face))
+        triangulation._face_cycles = tuple(ans)
+    return [list(face) for face in triangulation._face_cycles]
+
+def arrow_literal(tet, a, b):
+    """
+    The literal which is true when the edge of tet from vertex a to
+    vertex b is oriented a -> b.
+    """
+    edge, sign = tet.edge_info[a, b]
+    return sign*(edge + 1)
+
+def sink_edge_clauses(triangulation, first_var):
+    """
+    Clauses which forbid sink edges, that is, edges which are very
+    long in every adjacent tetrahedron; see EdgeOrientation.  For
+    each corner of an edge we add an auxiliary variable, numbered
+    consecutively from first_var, which is true exactly when the
+    edge is very long in that corner.  As the auxiliary variables
+    are determined by the edge variables, each orientation still
+    corresponds to a single model.
+    """
+    edge_info, edge_corners = _edge_tables(triangulation)
+    return sink_edge_clauses_from_corners(edge_info, edge_corners, first_var)
+
+def _edge_tables(triangulation):
+    """
+    The "edge_info" dict of each tetrahedron and the corners of each
+    edge, as used by sink_edge_clauses_from_corners.
+    """
     if not hasattr(triangulation, '_edge_info'):
         record_orientations_of_edges(triangulation)
-    ans = []
-    for tet in triangulation.Tetrahedra:        
-        for vertices in VerticesOfFace.values():
-            face = []
-            for i in range(3):
-                a, b = vertices[i], vertices[(i+1)%3]
-                edge, sign = tet.edge_info[a, b]
-                face.append(sign*(edge + 1))
-            ans.append(face)
-    return ans 
+    edge_info = [tet.edge_info for tet in triangulation.Tetrahedra]
+    edge_corners = [[(c.Tetrahedron.Index, c.Subsimplex) for c in edge.Corners]
+                    for edge in triangulation.Edges]
+    return edge_info, edge_corners
+
+def sink_edge_clauses_from_corners(edge_info, edge_corners, first_var):
+    """
+    The clauses of sink_edge_clauses, given the "edge_info" dict of
+    each tetrahedron and the corners of each edge as pairs (tet
+    index, subsimplex), so no Mcomplex is needed.
+    """
+    clauses = []
+    var = first_var
+    for corners in edge_corners:
+        corner_vars = []
+        for t, e in corners:
+            info = edge_info[t]
+            a, b = Tail[e], Head[e]
+            c, d = [v for v in ZeroSubsimplices if not v & e]
+            def arrow(x, y):
+                edge, sign = info[x, y]
+                return sign*(edge + 1)
+            # The edge is very long either running a -> b with a a
+            # source and b a sink, or the other way round.
+            for x, y in [(a, b), (b, a)]:
+                long_arrows = [arrow(x, c), arrow(x, d), arrow(c, y), arrow(d, y)]
+                clauses.append([var, -arrow(x, y)] + [-l for l in long_arrows])
+                for l in long_arrows:
+                    clauses.append([-var, -arrow(x, y), l])
+            corner_vars.append(var)
+            var += 1
+        clauses.append([-v for v in corner_vars])
+    return clauses
+
+# -------- Symmetry breaking --------
+
+def _extend_to_isomorphism(tet0, image0, perm0):
+    """
+    Tries to extend tet0 -> (image0, perm0) to a combinatorial
+    automorphism of the triangulation, returned as a dict mapping
+    each tetrahedron to its image and vertex permutation.
+    """
+    ans = {tet0: (image0, perm0)}
+    todo = [tet0]
+    while todo:
+        A = todo.pop()
+        B, sigma = ans[A]
+        for f in TwoSubsimplices:
+            C = A.Neighbor[f]
+            g = sigma.image(f)
+            D = B.Neighbor[g]
+            tau = B.Gluing[g] * sigma * inv(A.Gluing[f])
+            if C in ans:
+                if ans[C][0] is not D or ans[C][1].tuple() != tau.tuple():
+                    return None
+            else:
+                ans[C] = (D, tau)
+                todo.append(C)
+    return ans
+
+def automorphisms(triangulation):
+    """
+    The nontrivial actions of the combinatorial automorphisms of the
+    triangulation on its edges, both orientation preserving and
+    reversing.  Each is given as a list of literals, the ith entry
+    being s*(j + 1) if the automorphism carries edge i to edge j and
+    its default orientation to s times that of edge j.
+
+    >>> M = t3m.Mcomplex('lLLvMMMQccdfghhikkjjkhsawrksqqmdw')
+    >>> len(automorphisms(M))
+    1
+    """
+    tet0 = triangulation.Tetrahedra[0]
+    ans = set()
+    for image in triangulation.Tetrahedra:
+        for perm in Perm4.S4():
+            iso = _extend_to_isomorphism(tet0, image, perm)
+            if iso is None:
+                continue
+            action = []
+            for edge in triangulation.Edges:
+                corner = edge.Corners[0]
+                tet, e = corner.Tetrahedron, corner.Subsimplex
+                a, b = Tail[e], Head[e]
+                new_tet, sigma = iso[tet]
+                new_edge = new_tet.Class[sigma.image(e)]
+                s = (edge.orientation_with_respect_to(tet, a, b) *
+                     new_edge.orientation_with_respect_to(new_tet,
+                                                          sigma.image(a),
+                                                          sigma.image(b)))
+                action.append(s*(new_edge.Index + 1))
+            ans.add(tuple(action))
+    ans.discard(tuple(range(1, len(triangulation.Edges) + 1)))
+    return sorted(ans)
+
+def lex_leader_clauses(action, first_var):
+    """
+    Clauses saying that the orientation x is lexicographically at
+    least its image y under the given action, where "true" beats
+    "false".  Auxiliary variable e_j, numbered from first_var, is
+    equivalent to x and y agreeing in the first j places, so each
+    orientation is still a single model.
+    """
+    n = len(action)
+    y = n*[None]
+    for i, lit in enumerate(action):
+        j, s = abs(lit) - 1, 1 if lit > 0 else -1
+        y[j] = s*(i + 1)
+    clauses = []
+    prev = None
+    for j in range(n):
+        x_j, y_j = j + 1, y[j]
+        if x_j == y_j:
+            continue
+        if x_j == -y_j:
+            # The first place they can differ, and they must.
+            clauses.append([x_j] if prev is None else [-prev, x_j])
+            break
+        e = first_var
+        first_var += 1
+        guard = [] if prev is None else [-prev]
+        clauses.append(guard + [x_j, -y_j])
+        clauses += [[-e, -x_j, y_j], [-e, x_j, -y_j],
+                    guard + [e, x_j, y_j], guard + [e, -x_j, -y_j]]
+        if prev is not None:
+            clauses.append([-e, prev])
+        prev = e
+    return clauses, first_var
+
+def symmetry_breaking_clauses(triangulation, first_var):
+    """
+    Lex-leader clauses for the automorphism group of the
+    triangulation combined with the global reversal of all edges, so
+    that exactly one orientation is allowed in each orbit.
+    """
+    clauses = []
+    for action in automorphisms(triangulation):
+        for g in [action, [-lit for lit in action]]:
+            new_clauses, first_var = lex_leader_clauses(g, first_var)
+            clauses += new_clauses
+    return clauses
+
+def orbit(triangulation, signs, actions=None):
+    """
+    All orientations equivalent to the given one under the
+    automorphisms of the triangulation, normalized so that the
+    first edge is positively oriented.
+
+    >>> M = t3m.Mcomplex('lLLvMMMQccdfghhikkjjkhsawrksqqmdw')
+    >>> reps = list(cycle_free_orientations(M, symmetry=True))
+    >>> len(reps), sum(len(orbit(M, signs)) for signs in reps)
+    (4, 8)
+    """
+    if actions is None:
+        actions = automorphisms(triangulation)
+    ans = {tuple(signs)}
+    for action in actions:
+        new = len(signs)*[0]
+        for i, lit in enumerate(action):
+            new[abs(lit) - 1] = (1 if lit > 0 else -1) * signs[i]
+        if new[0] < 0:
+            new = [-s for s in new]
+        ans.add(tuple(new))
+    return [list(signs) for signs in sorted(ans, reverse=True)]
+
+def clauses_from_tables(face_cycles, edge_info, edge_corners, no_sink_edges=False):
+    """
+    The clauses of orientation_clauses, without symmetry breaking,
+    given the cycles of oriented_edges_around_faces and, if
+    no_sink_edges is set, the tables of sink_edge_clauses_from_corners,
+    so no Mcomplex is needed.
+    """
+    clauses = [list(face) for face in face_cycles]
+    # By symmetry, can assume the first edge is positively oriented.
+    clauses.append([1])
+    if no_sink_edges:
+        clauses += sink_edge_clauses_from_corners(edge_info, edge_corners,
+                                                  len(edge_corners) + 1)
+    return clauses
+
+def orientation_clauses(triangulation, no_sink_edges=False, symmetry=False):
+    """
+    The clauses whose models are the orientations of the one-skeleton
+    where no triangular face is a directed cycle, with variable i
+    corresponding to the edge with index i - 1.  If no_sink_edges is
+    set, additional clauses (and variables) exclude orientations with
+    a sink edge.  If symmetry is set, only one orientation in each
+    orbit of the automorphism group is allowed.
+    """
+    face_cycles = oriented_edges_around_faces(triangulation)
+    edge_info, edge_corners = _edge_tables(triangulation) if no_sink_edges else (None, None)
+    clauses = clauses_from_tables(face_cycles, edge_info, edge_corners, no_sink_edges)
+    if symmetry:
+        first_var = max(abs(lit) for clause in clauses for lit in clause) + 1
+        clauses += symmetry_breaking_clauses(triangulation, first_var)
+    return clauses
 
 def all_solutions(solver):
     """
@@ -82,7 +321,8 @@ def all_solutions(solver):
             clause = [-i if s else i for i, s in enumerate(solution)]
             solver.add_clause(tuple(clause[1:]))
 
-def cycle_free_orientations_cryptominisat(triangulation):
+def cycle_free_orientations_cryptominisat(triangulation, no_sink_edges=False,
+                                          symmetry=False):
     """
     Returns all orientations of the one-skeleton where no triangular
     face is a directed cycle.  Orientations are given relative to the
@@ -97,15 +337,14 @@ def cycle_free_orientations_cryptominisat(triangulation):
     """
     from sage.sat.solvers import CryptoMiniSat
     solver = CryptoMiniSat()
-    for face_data in oriented_edges_around_faces(triangulation):
-        solver.add_clause(face_data)
-    # By symmetry, we might as well assume the first edge is
-    # positively oriented
-    solver.add_clause((1,))
+    for clause in orientation_clauses(triangulation, no_sink_edges, symmetry):
+        solver.add_clause(tuple(clause))
+    num_edges = len(triangulation.Edges)
     for sol in all_solutions(solver):
-        yield [1 if s else -1 for s in sol[1:]]
+        yield [1 if s else -1 for s in sol[1:num_edges + 1]]
 
-def cycle_free_orientations_picosat(triangulation):
+def cycle_free_orientations_picosat(triangulation, no_sink_edges=False,
+                                    symmetry=False):
     """
     Returns all orientations of the one-skeleton where no triangular
     face is a directed cycle.  Orientations are given relative to the
@@ -117,21 +356,312 @@ def cycle_free_orientations_picosat(triangulation):
     >>> M = t3m.Mcomplex('jLvLQAQbffghghiiieuaiikktuu')
     >>> len(list(cycle_free_orientations(M, 'picosat')))
     10
+    >>> len(list(cycle_free_orientations(M, 'picosat', no_sink_edges=True)))
+    9
     """
     import pycosat
-    clauses = oriented_edges_around_faces(triangulation)
-    # By symmetry, can assume the first edge is positively oriented.
-    clauses.append([1])
+    clauses = orientation_clauses(triangulation, no_sink_edges, symmetry)
+    num_edges = len(triangulation.Edges)
     for sol in pycosat.itersolve(clauses):
-        yield [1 if s > 0 else -1 for s in sol]
+        yield [1 if s > 0 else -1 for s in sol[:num_edges]]
+
+def guided_orientations(triangulation, explain, no_sink_edges=True, symmetry=False,
+                        method='picosat'):
+    """
+    Lazy clause generation: each model found is passed to explain,
+    which returns None if the orientation is acceptable, and otherwise
+    a clause that it violates and which every acceptable orientation
+    satisfies.  This clause is added to the instance, so whole
+    families of bad orientations are pruned at once.  Acceptable
+    orientations are yielded, and an empty clause ends the search.
+    The search is incremental when the SAT backend given by method
+    is, e.g. for 'cadical'.
+
+    >>> M = t3m.Mcomplex('jLvLQAQbffghghiiieuaiikktuu')
+    >>> len(list(guided_orientations(M, lambda signs: None, False)))
+    10
+    >>> second_edge_negative = lambda signs: None if signs[1] < 0 else [-2]
+    >>> len(list(guided_orientations(M, second_edge_negative, False)))
+    6
+    """
+    clauses = orientation_clauses(triangulation, no_sink_edges, symmetry)
+    num_edges = len(triangulation.Edges)
+    with sat_backends.new_solver(method, clauses) as solver:
+        while True:
+            sol = solver.solve()
+            if sol is None:
+                return
+            signs = [1 if s > 0 else -1 for s in sol[:num_edges]]
+            clause = explain(signs)
+            if clause is None:
+                yield signs
+                solver.block(sol, num_edges)
+            elif len(clause) == 0:
+                return
+            else:
+                solver.add_clause(clause)
+
+def cycle_free_orientations_backend(triangulation, method, no_sink_edges=False,
+                                    symmetry=False):
+    """
+    Same as cycle_free_orientations_picosat but using any backend
+    registered in sat_backends.
+
+    >>> M = t3m.Mcomplex('jLvLQAQbffghghiiieuaiikktuu')
+    >>> len(list(cycle_free_orientations(M, 'cadical')))  # doctest: +SKIP
+    10
+    """
+    clauses = orientation_clauses(triangulation, no_sink_edges, symmetry)
+    num_edges = len(triangulation.Edges)
+    with sat_backends.new_solver(method, clauses) as solver:
+        for sol in solver.models(num_edges):
+            yield [1 if s > 0 else -1 for s in sol]
+
+def _solve_cube(job):
+    """
+    All models of one cube, restricted to the edge variables.
+    """
+    import pycosat
+    clauses, num_edges = job
+    return [[1 if s > 0 else -1 for s in sol[:num_edges]]
+            for sol in pycosat.itersolve(clauses)]
 
-def cycle_free_orientations(triangulation, method='picosat'):
-    if method=='picosat':
-        return cycle_free_orientations_picosat(triangulation)
+def cube_edges(triangulation, depth):
+    """
+    The edges used to split the search into cubes: those of highest
+    degree, as fixing their orientations constrains the most faces.
+    The first edge is skipped as its orientation is already fixed.
+    """
+    edges = sorted(triangulation.Edges[1:], key=lambda e: -len(e.Corners))
+    return [e.Index for e in edges[:depth]]
+
+def cycle_free_orientations_cubes(triangulation, workers, depth=None,
+                                  no_sink_edges=False, symmetry=False):
+    """
+    Cube-and-conquer version of cycle_free_orientations_picosat: the
+    orientations of a few high-degree edges are fixed in every
+    possible way, and the resulting 2^depth subproblems are solved by
+    a pool of worker processes, the answers being yielded as each
+    cube finishes.  By default, depth gives about four cubes per
+    worker.
+
+    >>> M = t3m.Mcomplex('jLvLQAQbffghghiiieuaiikktuu')
+    >>> len(list(cycle_free_orientations(M, workers=2)))
+    10
+    """
+    if depth is None:
+        depth = max(workers - 1, 1).bit_length() + 2
+    clauses = orientation_clauses(triangulation, no_sink_edges, symmetry)
+    num_edges = len(triangulation.Edges)
+    edges = cube_edges(triangulation, depth)
+    jobs = []
+    for cube_signs in itertools.product([1, -1], repeat=len(edges)):
+        cube = [[s*(e + 1)] for s, e in zip(cube_signs, edges)]
+        jobs.append((clauses + cube, num_edges))
+    with multiprocessing.Pool(workers) as pool:
+        for orients in pool.imap_unordered(_solve_cube, jobs):
+            for signs in orients:
+                yield signs
+
+def cycle_free_orientations(triangulation, method='picosat', no_sink_edges=False,
+                            symmetry=False, expand_orbits=False, workers=None):
+    """
+    If no_sink_edges is set, only orientations without sink edges
+    are returned; these are the only ones which can give foliations.
+
+    If symmetry is set, only one orientation is returned from each
+    orbit of the automorphism group of the triangulation; with
+    expand_orbits, each such orbit is then listed in full, so that
+    the answer is the same as without symmetry breaking.
+
+    The method can be any backend registered in sat_backends.  With
+    more than one worker, picosat is run in parallel using
+    cycle_free_orientations_cubes; the order of the answers then
+    varies from run to run.
+
+    >>> M = t3m.Mcomplex('lLLvMMMQccdfghhikkjjkhsawrksqqmdw')
+    >>> all_orients = sorted(cycle_free_orientations(M))
+    >>> all_orients == sorted(cycle_free_orientations(M, symmetry=True, expand_orbits=True))
+    True
+    """
+    parallel = workers is not None and workers > 1
+    if method=='picosat' and parallel:
+        orients = cycle_free_orientations_cubes(triangulation, workers,
+                                                no_sink_edges=no_sink_edges,
+                                                symmetry=symmetry)
+    elif method=='picosat':
+        orients = cycle_free_orientations_picosat(triangulation, no_sink_edges, symmetry)
+    elif parallel:
+        raise ValueError("Parallel enumeration is only supported for 'picosat'")
     elif method=='cryptominisat':
-        return cycle_free_orientations_cryptominisat(triangulation)
+        orients = cycle_free_orientations_cryptominisat(triangulation, no_sink_edges, symmetry)
     else:
-        raise ValueError("Method must be either 'picosat' or 'cryptominisat'")
+        orients = cycle_free_orientations_backend(triangulation, method,
+                                                  no_sink_edges, symmetry)
+    if symmetry and expand_orbits:
+        return expanded_orbits(triangulation, orients)
+    return orients
+
+def expanded_orbits(triangulation, orients):
+    actions = automorphisms(triangulation)
+    for signs in orients:
+        for new in orbit(triangulation, signs, actions):
+            yield new
+
+# -------- Counting --------
+
+def _variables(clauses):
+    return {abs(lit) for clause in clauses for lit in clause}
+
+def _assign(clauses, lits):
+    """
+    Sets the given literals true and does unit propagation.  Returns
+    the remaining clauses and the set of variables assigned, or None
+    if there is a conflict.
+    """
+    assigned = set()
+    lits = list(lits)
+    while lits:
+        lit = lits.pop()
+        if abs(lit) in assigned:
+            continue
+        assigned.add(abs(lit))
+        reduced = []
+        for clause in clauses:
+            if lit in clause:
+                continue
+            if -lit in clause:
+                clause = clause - {-lit}
+                if len(clause) == 0:
+                    return None
+                if len(clause) == 1:
+                    lits.append(next(iter(clause)))
+            reduced.append(clause)
+        clauses = reduced
+    return clauses, assigned
+
+def _components(clauses):
+    """
+    Splits the clauses into classes sharing no variables.
+    """
+    parent = dict()
+    def find(v):
+        while parent[v] != v:
+            parent[v] = parent[parent[v]]
+            v = parent[v]
+        return v
+    for clause in clauses:
+        vs = [abs(lit) for lit in clause]
+        for v in vs:
+            parent.setdefault(v, v)
+        root = find(vs[0])
+        for v in vs[1:]:
+            parent[find(v)] = root
+    components = dict()
+    for clause in clauses:
+        components.setdefault(find(abs(next(iter(clause)))), []).append(clause)
+    return list(components.values())
+
+def _branch_variable(clauses):
+    counts = dict()
+    for clause in clauses:
+        for lit in clause:
+            counts[abs(lit)] = counts.get(abs(lit), 0) + 1
+    return max(counts, key=counts.get)
+
+def _branches(clauses, num_vars):
+    """
+    The satisfiable-looking children after branching on one variable,
+    each with the number of variables that became unconstrained.
+    """
+    v = _branch_variable(clauses)
+    ans = []
+    for lit in [v, -v]:
+        result = _assign(clauses, [lit])
+        if result is not None:
+            reduced, assigned = result
+            free = num_vars - len(assigned) - len(_variables(reduced))
+            ans.append((reduced, free))
+    return ans
+
+def _count_models(clauses, cache):
+    """
+    The number of models of the clauses, which are frozensets, over
+    the variables occurring in them.  Independent components are
+    counted separately and cached.
+    """
+    if len(clauses) == 0:
+        return 1
+    key = frozenset(clauses)
+    if key in cache:
+        return cache[key]
+    components = _components(clauses)
+    if len(components) > 1:
+        ans = 1
+        for component in components:
+            ans *= _count_models(component, cache)
+    else:
+        num_vars = len(_variables(clauses))
+        ans = sum(_count_models(reduced, cache) << free
+                  for reduced, free in _branches(clauses, num_vars))
+    cache[key] = ans
+    return ans
+
+def _knuth_probe(clauses, rng):
+    """
+    One random path through the search tree, weighted so that its
+    expected value is the number of models.
+    """
+    weight = 1
+    while clauses:
+        children = _branches(clauses, len(_variables(clauses)))
+        if len(children) == 0:
+            return 0
+        clauses, free = rng.choice(children)
+        weight *= len(children) << free
+    return weight
+
+def count_cycle_free_orientations(triangulation, no_sink_edges=False,
+                                  budget=None, seed=None):
+    """
+    The number of orientations returned by cycle_free_orientations,
+    computed by a DPLL-style model counter with component caching
+    rather than by enumerating them.
+
+    If a time budget in seconds is given, returns instead a float
+    estimating this number, namely the average of as many random
+    probes of the search tree (Knuth's estimator) as fit in the
+    budget.  This is cheap even when the count is huge.
+
+    >>> M = t3m.Mcomplex('jLvLQAQbffghghiiieuaiikktuu')
+    >>> count_cycle_free_orientations(M)
+    10
+    >>> count_cycle_free_orientations(M, no_sink_edges=True)
+    9
+    >>> M = t3m.Mcomplex('jLvMLQQbfefgihhiixiptvvvgof')
+    >>> count_cycle_free_orientations(M), count_cycle_free_orientations(M, budget=0.1)
+    (0, 0.0)
+    """
+    clauses = orientation_clauses(triangulation, no_sink_edges)
+    num_vars = max(_variables(clauses))
+    clauses = list({frozenset(clause) for clause in clauses})
+    units = [lit for clause in clauses if len(clause) == 1 for lit in clause]
+    result = _assign(clauses, units)
+    if result is None:
+        return 0 if budget is None else 0.0
+    clauses, assigned = result
+    free = num_vars - len(assigned) - len(_variables(clauses))
+
+    if budget is None:
+        return _count_models(clauses, dict()) << free
+
+    rng = random.Random(seed)
+    total, probes = 0, 0
+    start = time.time()
+    while probes == 0 or time.time() - start < budget:
+        total += _knuth_probe(clauses, rng)
+        probes += 1
+    return float(total << free) / probes
 
 def compare_solvers():
     """
@@ -141,6 +671,7 @@ def compare_solvers():
     quite possibly just because it implements "itersolve" on the C
     side.
 
+    See sat_backends.benchmark for a comparison of all backends.
     """
     
     import snappy
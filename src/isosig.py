@@ -0,0 +1,297 @@
+"""
+Decoding an isosig straight into gluing arrays and edge, face and
+vertex classes, without building a t3m Mcomplex.  The labelling
+reproduces that of t3m.Mcomplex(isosig) exactly, so clauses and
+tables computed here can be used with the Mcomplex later on.
+
+Only isosigs of connected orientable triangulations without boundary
+are handled; for anything else a ValueError is raised, and callers
+should fall back on t3m.
+"""
+
+import itertools
+from snappy.snap.t3mlite.simplex import (ZeroSubsimplices, OneSubsimplices,
+                                         TwoSubsimplices, Tail, Head,
+                                         RightFace, OppTail, comp)
+from . import find_orient, edge_orient
+
+Characters = ('abcdefghijklmnopqrstuvwxyz'
+              'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+              '0123456789+-')
+CharacterValue = {c: i for i, c in enumerate(Characters)}
+OrderedS4 = list(itertools.permutations(range(4)))
+Identity = (0, 1, 2, 3)
+Swap23 = (0, 1, 3, 2)
+
+def _read(isosig, pos, num_chars):
+    try:
+        digits = [CharacterValue[c] for c in isosig[pos:pos + num_chars]]
+    except KeyError:
+        raise ValueError('Invalid character in isosig')
+    if len(digits) < num_chars:
+        raise ValueError('Isosig is truncated')
+    return sum(d << 6*i for i, d in enumerate(digits)), pos + num_chars
+
+def _parity(perm):
+    return sum(perm[i] > perm[j] for i in range(4) for j in range(i + 1, 4)) % 2
+
+def _regina_gluings(isosig):
+    """
+    The gluings as Regina builds them from the isosig: the ith entry
+    is the list of the four tetrahedra glued to faces 0, 1, 2, 3 of
+    tetrahedron i and the list of the permutations doing so.
+    """
+    n, pos = _read(isosig, 0, 1)
+    num_chars = 1
+    if n == 63:
+        num_chars, pos = _read(isosig, pos, 1)
+        n, pos = _read(isosig, pos, num_chars)
+    if n == 0:
+        raise ValueError('Empty triangulation')
+
+    actions, facets, joins = [], 0, 0
+    while facets < 4*n:
+        c, pos = _read(isosig, pos, 1)
+        for j in range(3):
+            if facets < 4*n:
+                action = (c >> 2*j) & 3
+                if action == 0:
+                    raise ValueError('Triangulation has boundary')
+                if action == 3:
+                    raise ValueError('Invalid isosig')
+                facets += 2
+                joins += action == 2
+                actions.append(action)
+    destinations = []
+    for i in range(joins):
+        dest, pos = _read(isosig, pos, num_chars)
+        destinations.append(dest)
+    perms = []
+    for i in range(joins):
+        k, pos = _read(isosig, pos, 1)
+        if k >= 24:
+            raise ValueError('Invalid isosig')
+        perms.append(OrderedS4[k])
+    if pos != len(isosig):
+        raise ValueError('Only connected triangulations are supported')
+
+    neighbors = [4*[None] for i in range(n)]
+    gluings = [4*[None] for i in range(n)]
+    actions, destinations, perms = iter(actions), iter(destinations), iter(perms)
+    next_unused = 1
+    for t in range(n):
+        for f in range(4):
+            if neighbors[t][f] is not None:
+                continue
+            if next(actions) == 1:
+                u, perm = next_unused, Identity
+                next_unused += 1
+            else:
+                u, perm = next(destinations), next(perms)
+            if u >= n or neighbors[u][perm[f]] is not None:
+                raise ValueError('Invalid isosig')
+            inverse = 4*[0]
+            for i in range(4):
+                inverse[perm[i]] = i
+            neighbors[t][f], gluings[t][f] = u, perm
+            neighbors[u][perm[f]], gluings[u][perm[f]] = t, tuple(inverse)
+    return list(zip(neighbors, gluings))
+
+def decode_isosig(isosig):
+    """
+    The gluing data of the triangulation with the given isosig, in the
+    form returned by SnapPy's _get_tetrahedra_gluing_data.  Like
+    SnapPy, we orient the triangulation by swapping vertices 2 and 3
+    of some tetrahedra, keeping the first one fixed, so that every
+    gluing is odd.
+
+    >>> decode_isosig('cPcbbbiht')[0]
+    ([1, 1, 1, 1], [(0, 1, 3, 2), (1, 3, 0, 2), (1, 0, 2, 3), (2, 0, 3, 1)])
+    >>> import snappy
+    >>> iso = 'jLLvQPQcdfhghigiihshhgfifme'
+    >>> data = snappy.Triangulation(iso, remove_finite_vertices=False)._get_tetrahedra_gluing_data()
+    >>> decode_isosig(iso) == [(n, [tuple(p) for p in g]) for n, g in data]
+    True
+    """
+    data = _regina_gluings(isosig)
+    flip = [None for tet in data]
+    flip[0] = 0
+    todo = [0]
+    while todo:
+        t = todo.pop()
+        for u, perm in zip(*data[t]):
+            want = (1 + _parity(perm) + flip[t]) % 2
+            if flip[u] is None:
+                flip[u] = want
+                todo.append(u)
+            elif flip[u] != want:
+                raise ValueError('Triangulation is not orientable')
+
+    relabel = [Swap23 if f else Identity for f in flip]
+    ans = []
+    for t, (neighbors, gluings) in enumerate(data):
+        s = relabel[t]
+        new_neighbors, new_gluings = [], []
+        for k in range(4):
+            u, perm = neighbors[s[k]], gluings[s[k]]
+            new_neighbors.append(u)
+            new_gluings.append(tuple(relabel[u][perm[s[i]]] for i in range(4)))
+        ans.append((new_neighbors, new_gluings))
+    return ans
+
+def _image(perm, subsimplex):
+    return sum(1 << perm[i] for i in range(4) if subsimplex & (1 << i))
+
+def _face_number(face):
+    return comp(face).bit_length() - 1
+
+
+class TriangulationTables(object):
+    """
+    What DecodedTriangulation and compiled.CompiledTriangulation
+    provide on top of their attributes vertex_link_genera,
+    face_cycles, edge_info and edge_corners.
+    """
+    def is_closed_one_vertex(self):
+        """
+        Whether there is a single vertex whose link is a sphere.
+        """
+        return self.vertex_link_genera == (0,)
+
+    def orientation_clauses(self, no_sink_edges=False):
+        """
+        The clauses of find_orient.orientation_clauses, without
+        symmetry breaking.
+        """
+        return find_orient.clauses_from_tables(self.face_cycles, self.edge_info,
+                                               self.edge_corners, no_sink_edges)
+
+
+class DecodedTriangulation(TriangulationTables):
+    """
+    The combinatorics of a closed triangulation read off its isosig,
+    with the same numbering of edges, faces and vertices, and the same
+    orientations of the edges, as t3m.Mcomplex(isosig).  Provides the
+    "edge_info" dict of each tetrahedron, the corners and ends of each
+    edge, the face cycles of find_orient.oriented_edges_around_faces,
+    and the tables of edge_orient.record_tetrahedron_tables.
+
+    >>> D = DecodedTriangulation('jLLvQPQcdfhghigiihshhgfifme')
+    >>> D.num_tetrahedra, D.num_edges, D.num_faces, D.num_vertices
+    (9, 10, 18, 1)
+    >>> D.vertex_link_genera
+    (0,)
+    >>> len(D.orientation_clauses()), len(D.orientation_clauses(True))
+    (37, 587)
+    """
+    def __init__(self, isosig):
+        self.isosig = isosig
+        self.gluings = data = decode_isosig(isosig)
+        n = self.num_tetrahedra = len(data)
+
+        # Faces, numbered in order of first appearance.
+        faces = [4*[None] for t in range(n)]
+        num_faces = 0
+        for t in range(n):
+            for k in range(4):
+                if faces[t][k] is None:
+                    u, perm = data[t][0][k], data[t][1][k]
+                    faces[t][k] = faces[u][perm[k]] = num_faces
+                    num_faces += 1
+        self.num_faces = num_faces
+
+        # Edges, walking around each one as t3m does, so the corners
+        # come in the same order and the edges get the same orientation.
+        edges = [dict() for t in range(n)]
+        edge_info = [dict() for t in range(n)]
+        edge_corners = []
+        for t in range(n):
+            for e in OneSubsimplices:
+                if e in edges[t]:
+                    continue
+                index = len(edge_corners)
+                corners = []
+                start = (t, e, RightFace[e])
+                tet, edge, face = start
+                while True:
+                    corners.append((tet, edge))
+                    edges[tet][edge] = index
+                    tail, head = comp(face), face & comp(edge)
+                    tail, head = OppTail[tail, head], edge & comp(OppTail[tail, head])
+                    edge_info[tet][tail, head] = (index, 1)
+                    edge_info[tet][head, tail] = (index, -1)
+                    k = _face_number(face)
+                    perm = data[tet][1][k]
+                    tet = data[tet][0][k]
+                    edge = _image(perm, edge)
+                    face = edge | comp(_image(perm, face))
+                    if (tet, edge, face) == start:
+                        break
+                edge_corners.append(tuple(corners))
+        self.num_edges = len(edge_corners)
+        self.edge_info = edge_info
+        self.edge_corners = tuple(edge_corners)
+
+        # Vertices
+        vertices = [4*[None] for t in range(n)]
+        tet_corners = []
+        for t in range(n):
+            for v in range(4):
+                if vertices[t][v] is None:
+                    index = len(tet_corners)
+                    vertices[t][v] = index
+                    count, todo = 0, [(t, v)]
+                    while todo:
+                        tet, w = todo.pop()
+                        count += 1
+                        for k in range(4):
+                            if k != w:
+                                u, perm = data[tet][0][k], data[tet][1][k]
+                                if vertices[u][perm[w]] is None:
+                                    vertices[u][perm[w]] = index
+                                    todo.append((u, perm[w]))
+                    tet_corners.append(count)
+        self.num_vertices = len(tet_corners)
+        vertex = lambda t, v: vertices[t][v.bit_length() - 1]
+        self.edge_ends = tuple((vertex(t, Tail[e]), vertex(t, Head[e]))
+                               for (t, e), *rest in edge_corners)
+
+        # The Euler characteristic of each vertex link.
+        chi = list(tet_corners)
+        for a, b in self.edge_ends:
+            chi[a] += 1
+            chi[b] += 1
+        seen = set()
+        for t in range(n):
+            for k in range(4):
+                if faces[t][k] not in seen:
+                    seen.add(faces[t][k])
+                    for v in range(4):
+                        if v != k:
+                            chi[vertices[t][v]] -= 1
+        self.vertex_link_genera = tuple((2 - x)//2 for x in chi)
+
+        self.face_cycles = tuple(
+            tuple(sign*(edge + 1) for edge, sign in
+                  (edge_info[t][vs[i], vs[(i + 1) % 3]] for i in range(3)))
+            for t in range(n) for vs in find_orient.VerticesOfFace.values())
+
+        self._tet_classes = (edges, faces)
+        self._tet_tables = None
+
+    @property
+    def tet_tables(self):
+        """
+        Computed only when asked for, as they cost more than the rest
+        and are not needed to reject a triangulation.
+        """
+        if self._tet_tables is None:
+            edges, faces = self._tet_classes
+            self._tet_tables = []
+            for t in range(self.num_tetrahedra):
+                index = dict(edges[t])
+                for k, face in enumerate(TwoSubsimplices):
+                    index[face] = faces[t][k]
+                table = edge_orient.tetrahedron_table(self.edge_info[t], index)
+                self._tet_tables.append(table)
+        return self._tet_tables
@@ -22,7 +22,7 @@ anticlockwise when viewed from outside.
 import snappy.snap.t3mlite as t3m
 from snappy.snap.t3mlite.simplex import *
 from . import surface
-from sage.all import Graph, cached_method
+from .smith import cached_method
 
 # The vertices of the small triangular faces of the truncated tetrahedron 
 
@@ -96,6 +96,7 @@ class LinkSurface(surface.Surface):
 
     @cached_method
     def edge_graph(self):
+        from sage.all import Graph
         G = Graph()
         G.add_edges([[v.index for v in e.vertices] for e in self.edges])
         return G
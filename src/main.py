@@ -1,17 +1,103 @@
 import snappy
 import snappy.snap.t3mlite as t3m
-from . import util, edge_orient
+import multiprocessing
+import contextlib
+from . import util, edge_orient, find_orient, sat_backends
+from .compiled import cached_mcomplex, compiled_triangulation
+from .result_cache import default_result_cache, missing
 
 def has_compatible_foliation(snappy_manifold):
     ans = first_foliation(snappy_manifold)
     return ans is not None
 
-def first_foliation_mcomplex(mcomplex):
-    for eo in edge_orient.edge_orientations(mcomplex):
-        if eo.gives_foliation():
-            return eo
+def first_foliation_mcomplex(mcomplex, symmetry=False, guided=None):
+    """
+    As foliations are preserved by automorphisms, setting symmetry
+    only looks at one orientation in each orbit.  This is worth it
+    only for highly symmetric triangulations.  For guided, see
+    edge_orient.foliar_orientations.
+
+    >>> T = t3m.Mcomplex('tLLLLMLLwPMQPkacfihjinmlpmoqrpsrssjkgqqthqkwtvxofsqcaa')
+    >>> first_foliation_mcomplex(T).gives_foliation()
+    True
+    >>> first_foliation_mcomplex(T, guided='picosat').gives_foliation()
+    True
+    """
+    for eo in edge_orient.foliar_orientations(mcomplex, symmetry, guided):
+        return eo
     
-def first_foliation(snappy_manifold, rand_max, max_size):
+def _may_be_foliar(isosig):
+    """
+    A quick test, done on the CompiledTriangulation from the default
+    cache without building an Mcomplex, which rejects triangulations
+    that are not closed and one-vertex or have no acyclic edge
+    orientation without sink edges.
+
+    >>> _may_be_foliar('jLLvQPQcdfhghigiihshhgfifme')
+    True
+    >>> _may_be_foliar('nLLLwAPLQkcdefhhihklmlmmhsdarkdjselaxj')
+    False
+    """
+    C = compiled_triangulation(isosig)
+    if not C.is_closed_one_vertex():
+        return False
+    with sat_backends.new_solver('picosat', C.orientation_clauses(True)) as solver:
+        return solver.solve() is not None
+
+def _foliar_signs(isosig):
+    """
+    The job done by each worker of first_foliation: returns the isosig
+    and either the signs of a foliar orientation or None.  The answer
+    is looked up in, and saved to, the default ResultCache if any.
+    """
+    cache = default_result_cache()
+    if cache is not None:
+        signs = cache.get(isosig, 'first_foliar', missing)
+        if signs is not missing:
+            return isosig, signs
+    signs = None
+    if _may_be_foliar(isosig):
+        eo = first_foliation_mcomplex(cached_mcomplex(isosig))
+        if eo is not None:
+            signs = eo.signs
+    if cache is not None:
+        cache.set(isosig, 'first_foliar', signs)
+    return isosig, signs
+
+def _orientation(isosig, signs):
+    T = cached_mcomplex(isosig)
+    T.name = isosig
+    return edge_orient.EdgeOrientation(T, signs, check=False)
+
+def foliar_data(isosig):
+    """
+    For a closed one-vertex triangulation: the number of its acyclic
+    edge orientations, the signs of those giving foliations, and
+    whether the Euler class of each of these vanishes.  Saved to the
+    default ResultCache, if any.
+
+    >>> count, signs, vanish = foliar_data('jLLvMQQcdfigihghihsafroggnw')
+    >>> count, len(signs), len(vanish) == len(signs)
+    (12, 12, True)
+    """
+    cache = default_result_cache()
+    keys = ('num_acyclic', 'foliar_orientations', 'euler_vanishes')
+    if cache is not None:
+        ans = [cache.get(isosig, key, missing) for key in keys]
+        if missing not in ans:
+            return tuple(ans)
+    T = cached_mcomplex(isosig)
+    count = find_orient.count_cycle_free_orientations(T)
+    orients = [eo for eo in edge_orient.edge_orientations(T, no_sink_edges=True)
+               if eo.gives_foliation()]
+    vanish = edge_orient.euler_classes_vanish(orients)
+    ans = (count, [eo.signs for eo in orients], vanish)
+    if cache is not None:
+        for key, value in zip(keys, ans):
+            cache.set(isosig, key, value)
+    return ans
+
+def first_foliation(snappy_manifold, rand_max, max_size, workers=None):
     """
     Given a SnapPy Manifold which is closed, searches for a taut
     foliation as certified as a by a foliar orientation. The
@@ -23,6 +109,17 @@ def first_foliation(snappy_manifold, rand_max, max_size):
     * max_size: bounds the number of tetrahedra of any triangulation
       that will be examined in detail.
 
+    * workers: if more than one, the triangulations are examined in
+      parallel by a pool of this many processes, as they are found
+      by the main one, and the remaining work is abandoned as soon as
+      one of them finds a foliar orientation.
+
+    Triangulations are examined as soon as they are found, and the
+    search stops at the first foliar orientation.  The name of the
+    returned orientation's Mcomplex is its isosig.  What is learned
+    about each triangulation is kept in the default ResultCache, if
+    the environment variable FOLIAR_RESULT_CACHE enables it.
+
     >>> M = snappy.Manifold('m004(1, 2)')
     >>> eo = first_foliation(M, 5, 25)
     >>> eo.gives_foliation()
@@ -32,15 +129,89 @@ def first_foliation(snappy_manifold, rand_max, max_size):
     >>> eo = first_foliation(M, 5, 25)
     >>> eo is None
     True
+
+    >>> M = snappy.Manifold('m004(1, 2)')
+    >>> eo = first_foliation(M, 5, 25, workers=2)
+    >>> eo.gives_foliation(), eo.mcomplex.name == eo.mcomplex.isosig()
+    (True, True)
     """
-    t = 0
-    for iso in util.closed_isosigs(snappy_manifold, rand_max, max_size):
-        T = t3m.Mcomplex(iso)
-        if len(T.Vertices) == 1 and T.Vertices[0].link_genus() == 0:
-            orient = list(edge_orient.edge_orientations(T))
-            for eo in orient:
-                if eo.gives_foliation():
-                    return eo
+    # The isosigs are found serially, so that there is only one pool.
+    # Closing the generator ends any search it still has going.
+    isosigs = util.closed_isosigs_iter(snappy_manifold, rand_max, max_size)
+    with contextlib.closing(isosigs):
+        if workers is not None and workers > 1:
+            with multiprocessing.Pool(workers) as pool:
+                for iso, signs in pool.imap_unordered(_foliar_signs, isosigs):
+                    if signs is not None:
+                        # Leaving the with-block terminates the other workers.
+                        return _orientation(iso, signs)
+            return None
+
+        for iso in isosigs:
+            signs = _foliar_signs(iso)[1]
+            if signs is not None:
+                return _orientation(iso, signs)
+
+def _filling_foliation(job):
+    """
+    The job done by each worker of classify_fillings.
+    """
+    isosig, slope, rand_max, max_size = job
+    M = snappy.Manifold(isosig)
+    M.dehn_fill(slope)
+    eo = first_foliation(M, rand_max, max_size)
+    return slope, None if eo is None else eo.mcomplex.name
+
+def classify_fillings(snappy_manifold, slopes, tries=100, rand_max=100,
+                      max_size=25, workers=None):
+    """
+    For a 1-cusped manifold and a list of slopes, looks for a taut
+    foliation on each Dehn filling, returning a dict taking each slope
+    to None or to a pair (kind, isosig) certifying the foliation:
+
+    * ('persistent', isosig) when the cusped triangulation with this
+      isosig has a persistently foliar orientation whose degeneracy
+      slope is not the given one.  These are found once and for all
+      by edge_orient.degeneracy_slopes_with_search, with the given
+      number of tries.
+
+    * ('closed', isosig) when first_foliation, with the given rand_max
+      and max_size, finds a foliar orientation on the closed
+      triangulation with this isosig.  This is only tried for slopes
+      not handled by the first method, by this many workers in
+      parallel.
+
+    >>> M = snappy.Manifold('m004')
+    >>> ans = classify_fillings(M, [(1, 2), (-3, 1), (1, 0)], tries=0, rand_max=5)
+    >>> ans[(1, 2)], ans[(-3, 1)], ans[(1, 0)]
+    (('persistent', 'cPcbbbiht_BaCB'), ('persistent', 'cPcbbbiht_BaCB'), None)
+    >>> ans = classify_fillings('m003', [(-1, 3), (-3, 1)], tries=0, rand_max=5, workers=2)
+    >>> ans[(-1, 3)][0], ans[(-3, 1)]
+    ('closed', None)
+    """
+    M = snappy.Manifold(snappy_manifold)
+    degeneracy, triangulations = edge_orient.degeneracy_slopes_with_search(M, tries)
+    ans, leftover = dict(), []
+    for slope in slopes:
+        certificate = None
+        for degenerate, isosig in zip(degeneracy, triangulations):
+            if edge_orient.normalize_slope(slope) != degenerate:
+                certificate = ('persistent', isosig)
+                break
+        ans[slope] = certificate
+        if certificate is None:
+            leftover.append(slope)
+
+    isosig = M.triangulation_isosig()
+    jobs = [(isosig, slope, rand_max, max_size) for slope in leftover]
+    if workers is not None and workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            results = list(pool.imap_unordered(_filling_foliation, jobs))
+    else:
+        results = map(_filling_foliation, jobs)
+    for slope, closed in results:
+        ans[slope] = None if closed is None else ('closed', closed)
+    return ans
 
 def nonorderable(snappy_manifold, max_triangulations=10):
     """
@@ -48,7 +219,7 @@ def nonorderable(snappy_manifold, max_triangulations=10):
     all edges of the triangualtions are homotopy esssential.
     """
     for iso in util.closed_isosigs(snappy_manifold)[:max_triangulations]:
-        T = t3m.Mcomplex(iso)
+        T = cached_mcomplex(iso)
         T.name = iso
         if len(T.Vertices) == 1 and T.Vertices[0].link_genus() == 0:
             orients = edge_orient.edge_orientations(T)
@@ -1,7 +1,7 @@
+import collections
 import snappy
 import snappy.snap.t3mlite as t3m
 from . import link, dual_cellulation
-from sage.all import matrix, vector, ZZ
 
 def peripheral_curve_from_snappy(dual_cell, snappy_data):
     D = dual_cell
@@ -27,18 +27,24 @@ def peripheral_curve_from_snappy(dual_cell, snappy_data):
     assert 2*sum(abs(w) for w in weights) == total_raw_weights
     return dual_cellulation.OneCycle(D, weights)
 
-def peripheral_curve_package(snappy_manifold):
+def _install(N, C, D, meridian, longitude, mstar, lstar, snappy_manifold):
     """
-    Given a 1-cusped snappy_manifold M, this function returns
-
-    1. A t3m MComplex of M, and
-    
-    2. the induced cusp triangulation, and
-
-    3. the dual to the cusp triangulation, and
+    Adds references to C, D, etc. to N for ease of use later.
+    """
+    N.cusp_triangulation = C
+    N.cusp_dual_cellulation = D
+    D.meridian, D.longitude = meridian, longitude
+    D.meridian_star, D.longitude_star = mstar, lstar
+    N.original_triangulation = snappy_manifold
+    def slope(onecycle):
+        return (D.meridian_star(onecycle), D.longitude_star(onecycle))
+    D.slope = slope
+    return N, C, D, (mstar, lstar)
 
-    4. two 1-cocycles on the dual cellulation which are
-    *algebraically* dual to the peripheral framming of M.
+def build_peripheral_curve_package(snappy_manifold):
+    """
+    Computes peripheral_curve_package from scratch, without changing
+    the labelling of the triangulation.
     """
     M = snappy_manifold.copy()
     assert M.num_cusps() == 1
@@ -49,25 +55,185 @@ def peripheral_curve_package(snappy_manifold):
     meridian = peripheral_curve_from_snappy(D, [data[i] for i in range(0, len(data), 4)])
     longitude = peripheral_curve_from_snappy(D, [data[i] for i in range(2, len(data), 4)])
     alpha, beta = D.integral_cohomology_basis()
-    A = matrix([[alpha(meridian), beta(meridian)], [alpha(longitude), beta(longitude)]])
-    assert abs(A.det()) == 1
-    Ainv = A.inverse().change_ring(ZZ)
-    B = Ainv.transpose()*matrix(ZZ, [alpha.weights, beta.weights])
-    mstar = dual_cellulation.OneCocycle(D, list(B[0]))
-    lstar = dual_cellulation.OneCocycle(D, list(B[1]))
-    AA = matrix([[mstar(meridian), lstar(meridian)], [mstar(longitude), lstar(longitude)]])
-    assert AA == 1
-
-    # Now add references to C, D, etc. to N for easy of use later
-    N.cusp_triangulation = C
-    N.cusp_dual_cellulation = D
-    D.meridian, D.longitude = meridian, longitude
-    D.meridian_star, D.longitude_star = mstar, lstar
-    N.original_triangulation = snappy_manifold
-    def slope(onecycle):
-        return vector([D.meridian_star(onecycle), D.longitude_star(onecycle)])
-    D.slope = slope
-    return N, C, D, (mstar, lstar)
+    a, b = alpha(meridian), beta(meridian)
+    c, d = alpha(longitude), beta(longitude)
+    det = a*d - b*c
+    assert abs(det) == 1
+    # The transpose of the inverse of [[a, b], [c, d]] applied to alpha, beta.
+    mstar = dual_cellulation.OneCocycle(
+        D, [det*(d*x - c*y) for x, y in zip(alpha.weights, beta.weights)])
+    lstar = dual_cellulation.OneCocycle(
+        D, [det*(a*y - b*x) for x, y in zip(alpha.weights, beta.weights)])
+    assert (mstar(meridian), lstar(meridian)) == (1, 0)
+    assert (mstar(longitude), lstar(longitude)) == (0, 1)
+    return _install(N, C, D, meridian, longitude, mstar, lstar, snappy_manifold)
+
+
+class PeripheralData(object):
+    """
+    The picklable essence of a peripheral curve package: the decorated
+    isosig of the triangulation and the weights of the meridian, the
+    longitude and their dual cocycles on the dual cellulation of the
+    cusp.  Rebuilding the package from this skips reading the curves
+    off SnapPea and computing the cohomology of the cusp.
+
+    >>> import pickle
+    >>> data = PeripheralData.from_manifold(snappy.Triangulation('m004'))
+    >>> N, C, D, (mstar, lstar) = pickle.loads(pickle.dumps(data)).package()
+    >>> D.slope(D.meridian), D.slope(D.longitude)
+    ((1, 0), (0, 1))
+    """
+    def __init__(self, isosig, meridian, longitude, meridian_star, longitude_star):
+        self.isosig = isosig
+        self.meridian, self.longitude = meridian, longitude
+        self.meridian_star, self.longitude_star = meridian_star, longitude_star
+
+    @classmethod
+    def from_manifold(cls, snappy_manifold):
+        isosig = snappy_manifold.triangulation_isosig()
+        N, C, D, stars = build_peripheral_curve_package(snappy.Triangulation(isosig))
+        return cls.from_package(isosig, D)
+
+    @classmethod
+    def from_package(cls, isosig, D):
+        return cls(isosig, list(D.meridian.weights), list(D.longitude.weights),
+                   list(D.meridian_star.weights), list(D.longitude_star.weights))
+
+    def package(self):
+        M = snappy.Triangulation(self.isosig)
+        N = t3m.Mcomplex(M)
+        C = link.LinkSurface(N)
+        D = dual_cellulation.DualCellulation(C)
+        return _install(N, C, D,
+                        dual_cellulation.OneCycle(D, list(self.meridian)),
+                        dual_cellulation.OneCycle(D, list(self.longitude)),
+                        dual_cellulation.OneCocycle(D, list(self.meridian_star)),
+                        dual_cellulation.OneCocycle(D, list(self.longitude_star)), M)
+
+
+class PeripheralCache(object):
+    """
+    An LRU cache of peripheral curve packages, keyed by decorated
+    isosig so that the peripheral framing is part of the key, holding
+    at most max_size of them.  Also keeps, in a second LRU cache
+    holding at most max_data_size entries, the PeripheralData of the
+    packages it has seen, or been given by add_data, for instance by
+    another process, to rebuild evicted packages cheaply.  This data
+    is small, so by default 16 times as many are kept.
+
+    The packages returned are shared between callers, so should be
+    treated as read only apart from the caches stored on them.
+
+    >>> cache = PeripheralCache(max_size=1)
+    >>> N = cache.package(snappy.Triangulation('m004'))[0]
+    >>> cache.package(snappy.Manifold('m004'))[0] is N
+    True
+    >>> N is cache.package(snappy.Triangulation('m003'))[0], len(cache)
+    (False, 1)
+    >>> fresh = PeripheralCache()
+    >>> fresh.add_data(cache.data(snappy.Triangulation('m004')))
+    >>> fresh.package(snappy.Triangulation('m004'))[2].slope(N.cusp_dual_cellulation.meridian)
+    (1, 0)
+    >>> fresh.computed, fresh.rebuilt
+    (0, 1)
+    >>> small = PeripheralCache(max_size=1, max_data_size=1)
+    >>> for name in ['m004', 'm003', 'm015']:
+    ...     small.add_data(cache.data(snappy.Triangulation(name)))
+    >>> len(small._data), small.data(snappy.Triangulation('m004')).isosig
+    (1, 'cPcbbbiht_BaCB')
+    >>> small.computed, small.rebuilt
+    (1, 0)
+    """
+    def __init__(self, max_size=256, max_data_size=None):
+        if max_data_size is None:
+            max_data_size = 16*max_size
+        self.max_size = max_size
+        self.max_data_size = max_data_size
+        self.computed, self.rebuilt = 0, 0
+        self._packages = collections.OrderedDict()
+        self._data = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._packages)
+
+    def add_data(self, data):
+        self._data[data.isosig] = data
+        self._data.move_to_end(data.isosig)
+        while len(self._data) > self.max_data_size:
+            self._data.popitem(last=False)
+
+    def data(self, snappy_manifold):
+        isosig = snappy_manifold.triangulation_isosig()
+        if isosig in self._data:
+            self._data.move_to_end(isosig)
+            return self._data[isosig]
+        package = self.package(snappy_manifold)
+        if isosig not in self._data:
+            self.add_data(PeripheralData.from_package(isosig, package[2]))
+        return self._data[isosig]
+
+    def package(self, snappy_manifold):
+        isosig = snappy_manifold.triangulation_isosig()
+        packages = self._packages
+        if isosig in packages:
+            packages.move_to_end(isosig)
+            return packages[isosig]
+        if isosig in self._data:
+            self._data.move_to_end(isosig)
+            package = self._data[isosig].package()
+            self.rebuilt += 1
+        else:
+            package = build_peripheral_curve_package(snappy.Triangulation(isosig))
+            self.add_data(PeripheralData.from_package(isosig, package[2]))
+            self.computed += 1
+        packages[isosig] = package
+        while len(packages) > self.max_size:
+            packages.popitem(last=False)
+        return package
+
+    def clear(self):
+        self._packages.clear()
+        self._data.clear()
+
+
+default_cache = PeripheralCache()
+
+def peripheral_curve_package(snappy_manifold, cached=True):
+    """
+    Given a 1-cusped snappy_manifold M, this function returns
+
+    1. A t3m MComplex of M, and
+    
+    2. the induced cusp triangulation, and
+
+    3. the dual to the cusp triangulation, and
+
+    4. two 1-cocycles on the dual cellulation which are
+    *algebraically* dual to the peripheral framming of M.
+
+    Unless cached is False, the answer comes from default_cache, and
+    is for the canonical retriangulation
+    snappy.Triangulation(M.triangulation_isosig()), which is kept as
+    the Mcomplex's original_triangulation.  This has the same
+    peripheral framing as M, so slopes are unchanged, but its
+    tetrahedra and edges may be labelled differently from those of M;
+    edge signs found using the package refer to the returned
+    Mcomplex.  Pass cached=False to keep the labelling of M.
+
+    >>> M = snappy.Manifold('m015')
+    >>> M.randomize()
+    >>> N = peripheral_curve_package(M)[0]
+    >>> peripheral_curve_package(snappy.Triangulation('m015'))[0] is N
+    True
+    >>> N.original_triangulation.triangulation_isosig() == M.triangulation_isosig()
+    True
+    >>> peripheral_curve_package(M, cached=False)[0].original_triangulation is M
+    True
+    """
+    if not cached:
+        return build_peripheral_curve_package(snappy_manifold)
+    assert snappy_manifold.num_cusps() == 1
+    return default_cache.package(snappy_manifold)
             
 def test_peripheral_curves(n=100, progress=True):
     """
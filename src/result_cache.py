@@ -0,0 +1,178 @@
+"""
+A persistent cache, in a local SQLite database, of what we have
+learned about triangulations, keyed by isosig: for instance the
+number of acyclic edge orientations, the foliar ones and whether
+their Euler classes vanish, or the degeneracy slopes.  Values are
+stored as JSON, so tuples come back as lists.
+
+The database uses write-ahead logging, so any number of processes on
+one machine can read and write it at once.  It holds at most
+max_entries values, evicting the least recently used ones.  So that
+reading stays read only, the times values were last used are noted in
+memory and only written out with the next set or evict, or once
+evict_every of them have piled up.
+
+The default cache, used by main.first_foliation and by
+edge_orient.degeneracy_slopes and edge_orient.is_persistent_tri, is
+only enabled if the environment variable FOLIAR_RESULT_CACHE gives
+the path of the database.
+"""
+
+import os
+import json
+import sqlite3
+import time
+
+missing = object()
+
+class ResultCache(object):
+    """
+    >>> import tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'results.sqlite')
+    >>> cache = ResultCache(path, max_entries=2, evict_every=1)
+    >>> cache.get('cPcbbbiht', 'slopes') is None
+    True
+    >>> cache.set('cPcbbbiht', 'slopes', [(1, 0)])
+    >>> cache.get('cPcbbbiht', 'slopes')
+    [[1, 0]]
+    >>> cache.set('cPcbbbiht', 'first_foliar', None)
+    >>> cache.get('cPcbbbiht', 'first_foliar', missing) is None
+    True
+    >>> cache.set('jLLvQPQcdfhghigiihshhgfifme', 'num_acyclic', 10)
+    >>> len(cache), cache.get('cPcbbbiht', 'slopes')
+    (2, None)
+    >>> ResultCache(path).get('jLLvQPQcdfhghigiihshhgfifme', 'num_acyclic')
+    10
+    >>> cache.set('cPcbbbiht', 'slopes', [(1, 0)])
+    >>> cache.set('jLLvQPQcdfhghigiihshhgfifme', 'num_acyclic', 11)
+    >>> cache.get('cPcbbbiht', 'slopes'), len(cache)
+    ([[1, 0]], 2)
+    >>> cache.set('cPcbbbiht', 'first_foliar', [1, -1])
+    >>> cache.get('cPcbbbiht', 'slopes'), cache.get('jLLvQPQcdfhghigiihshhgfifme', 'num_acyclic')
+    ([[1, 0]], None)
+    """
+    def __init__(self, path, max_entries=10**6, evict_every=1000, timeout=60):
+        self.path = path
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self.timeout = timeout
+        self._connection, self._pid = None, None
+        self._writes = 0
+        self._touched = dict()
+
+    def _connect(self):
+        """
+        Connections must not be shared with forked processes, so each
+        process opens its own.
+        """
+        if self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS results ('
+                         'isosig TEXT NOT NULL, key TEXT NOT NULL, '
+                         'value TEXT NOT NULL, used REAL NOT NULL, '
+                         'PRIMARY KEY (isosig, key))')
+            conn.execute('CREATE INDEX IF NOT EXISTS results_used ON results (used)')
+            # The number of rows, kept up to date by triggers so that
+            # eviction need not count them.
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('CREATE TABLE IF NOT EXISTS num_results ('
+                             'id INTEGER PRIMARY KEY CHECK (id = 0), num INTEGER NOT NULL)')
+                conn.execute('INSERT OR IGNORE INTO num_results '
+                             'SELECT 0, COUNT(*) FROM results')
+                conn.execute('CREATE TRIGGER IF NOT EXISTS results_insert '
+                             'AFTER INSERT ON results BEGIN '
+                             'UPDATE num_results SET num = num + 1; END')
+                conn.execute('CREATE TRIGGER IF NOT EXISTS results_delete '
+                             'AFTER DELETE ON results BEGIN '
+                             'UPDATE num_results SET num = num - 1; END')
+                conn.execute('COMMIT')
+            except:
+                conn.execute('ROLLBACK')
+                raise
+            self._connection, self._pid = conn, os.getpid()
+            self._touched = dict()
+        return self._connection
+
+    def _transaction(self, statements):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            statements(conn)
+            conn.execute('COMMIT')
+        except:
+            conn.execute('ROLLBACK')
+            raise
+
+    def __len__(self):
+        return self._connect().execute('SELECT num FROM num_results').fetchone()[0]
+
+    def get(self, isosig, key, default=None):
+        conn = self._connect()
+        row = conn.execute('SELECT value FROM results WHERE isosig=? AND key=?',
+                           (isosig, key)).fetchone()
+        if row is None:
+            return default
+        self._touched[isosig, key] = time.time()
+        if len(self._touched) >= self.evict_every:
+            self._transaction(self._flush)
+        return json.loads(row[0])
+
+    def _flush(self, conn):
+        """
+        Records when the values read since the last write were used.
+        """
+        if self._touched:
+            conn.executemany('UPDATE results SET used=max(used, ?) WHERE isosig=? AND key=?',
+                             [(used, isosig, key) for (isosig, key), used
+                              in self._touched.items()])
+            self._touched = dict()
+
+    def set(self, isosig, key, value):
+        def statements(conn):
+            self._flush(conn)
+            conn.execute('INSERT INTO results VALUES (?, ?, ?, ?) '
+                         'ON CONFLICT (isosig, key) DO UPDATE '
+                         'SET value=excluded.value, used=excluded.used',
+                         (isosig, key, json.dumps(value), time.time()))
+        self._transaction(statements)
+        self._writes += 1
+        if self._writes % self.evict_every == 0:
+            self.evict()
+
+    def evict(self):
+        """
+        Deletes the least recently used values beyond max_entries.
+        """
+        def statements(conn):
+            self._flush(conn)
+            num = conn.execute('SELECT num FROM num_results').fetchone()[0]
+            excess = num - self.max_entries
+            if excess > 0:
+                conn.execute('DELETE FROM results WHERE rowid IN '
+                             '(SELECT rowid FROM results ORDER BY used LIMIT ?)',
+                             (excess,))
+        self._transaction(statements)
+
+    def clear(self):
+        self._touched = dict()
+        self._connect().execute('DELETE FROM results')
+
+
+_default = None
+
+def default_result_cache():
+    """
+    The ResultCache at the path given by FOLIAR_RESULT_CACHE, or None
+    if that is not set.
+    """
+    global _default
+    path = os.environ.get('FOLIAR_RESULT_CACHE')
+    if not path:
+        return None
+    if _default is None or _default.path != path:
+        _default = ResultCache(path)
+    return _default
@@ -0,0 +1,261 @@
+"""
+A registry of SAT solvers behind a common incremental interface:
+clauses can be added at any time, the solver can be asked for a model
+under assumptions, and a model can be blocked.
+
+Each backend is only imported when a solver is created, so only the
+ones you actually use need to be installed:
+
+* 'picosat' uses the "pycosat" package.  It is not incremental, so
+  each call to solve starts from scratch, but enumerating models is
+  done on the C side.
+
+* 'cryptominisat' uses Sage's interface to CryptoMiniSat.
+
+* 'cadical', 'glucose' and 'minisat' use the "python-sat" package
+  (import name "pysat"), and are fully incremental.
+
+Running "python -m foliar.sat_backends [backend ...]" compares the
+given backends, by default all available ones, on a fixed corpus of
+triangulations; see benchmark.
+"""
+
+import snappy.snap.t3mlite as t3m
+
+
+class SATSolver(object):
+    """
+    Base class for the backends.  Subclasses need to implement
+    add_clause and solve; models may be overridden when the backend
+    has a faster way to enumerate.
+    """
+    def __init__(self, clauses=()):
+        for clause in clauses:
+            self.add_clause(clause)
+
+    def add_clause(self, clause):
+        raise NotImplementedError
+
+    def solve(self, assumptions=()):
+        """
+        Returns a model as a list of nonzero integers, the ith being
+        +/-(i + 1), or None if there is none.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Frees any resources held by the backend; the solver cannot be
+        used afterwards.  Solvers are also context managers which are
+        closed on exit.
+        """
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def block(self, model, num_vars=None):
+        """
+        Excludes the given model, or just its restriction to the first
+        num_vars variables, from all future answers.
+        """
+        if num_vars is None:
+            num_vars = len(model)
+        self.add_clause([-lit for lit in model[:num_vars]])
+
+    def models(self, num_vars=None, assumptions=()):
+        """
+        Iterates over all models, blocking each as it is found.  If
+        num_vars is given, the models are restricted to the first
+        num_vars variables, and any auxiliary variables must be
+        determined by these.
+        """
+        while True:
+            model = self.solve(assumptions)
+            if model is None:
+                return
+            self.block(model, num_vars)
+            yield model if num_vars is None else model[:num_vars]
+
+
+class PicosatSolver(SATSolver):
+    def __init__(self, clauses=()):
+        import pycosat
+        self.clauses = []
+        SATSolver.__init__(self, clauses)
+
+    def add_clause(self, clause):
+        self.clauses.append(list(clause))
+
+    def solve(self, assumptions=()):
+        import pycosat
+        sol = pycosat.solve(self.clauses + [[a] for a in assumptions])
+        return None if sol == 'UNSAT' else sol
+
+    def models(self, num_vars=None, assumptions=()):
+        import pycosat
+        clauses = self.clauses + [[a] for a in assumptions]
+        for sol in pycosat.itersolve(clauses):
+            self.block(sol, num_vars)
+            yield sol if num_vars is None else sol[:num_vars]
+
+
+class CryptoMiniSatSolver(SATSolver):
+    def __init__(self, clauses=()):
+        from sage.sat.solvers import CryptoMiniSat
+        self.solver = CryptoMiniSat()
+        SATSolver.__init__(self, clauses)
+
+    def add_clause(self, clause):
+        self.solver.add_clause(tuple(clause))
+
+    def solve(self, assumptions=()):
+        sol = self.solver(assumptions=list(assumptions) or None)
+        if sol is False:
+            return None
+        return [i if s else -i for i, s in enumerate(sol) if i > 0]
+
+
+class PySATSolver(SATSolver):
+    """
+    A solver from the "python-sat" package, given by its name there.
+    """
+    def __init__(self, clauses=(), name='cadical153'):
+        from pysat.solvers import Solver
+        self.solver = Solver(name=name)
+        SATSolver.__init__(self, clauses)
+
+    def add_clause(self, clause):
+        self.solver.add_clause(list(clause))
+
+    def solve(self, assumptions=()):
+        if self.solver.solve(assumptions=list(assumptions)):
+            return self.solver.get_model()
+        return None
+
+    def close(self):
+        if self.solver is not None:
+            self.solver.delete()
+            self.solver = None
+
+
+backends = dict()
+
+def register_backend(name, factory):
+    """
+    Makes a solver available under the given name; factory is called
+    with the initial list of clauses and returns a SATSolver.
+    """
+    backends[name] = factory
+
+register_backend('picosat', PicosatSolver)
+register_backend('cryptominisat', CryptoMiniSatSolver)
+register_backend('cadical', lambda clauses=(): PySATSolver(clauses, 'cadical153'))
+register_backend('glucose', lambda clauses=(): PySATSolver(clauses, 'glucose4'))
+register_backend('minisat', lambda clauses=(): PySATSolver(clauses, 'minisat22'))
+
+def new_solver(method, clauses=()):
+    """
+    >>> S = new_solver('picosat', [[1, 2], [-1]])
+    >>> S.solve()
+    [-1, 2]
+    >>> S.solve([-2]) is None
+    True
+    >>> S.block([-1, 2])
+    >>> S.solve() is None
+    True
+    >>> with new_solver('picosat', [[1], [2]]) as S:
+    ...     S.solve()
+    [1, 2]
+    """
+    if method not in backends:
+        raise ValueError('Unknown SAT backend %r; choose from %s' %
+                         (method, sorted(backends)))
+    return backends[method](clauses)
+
+def available_backends():
+    """
+    The registered backends which can actually be created here.
+    """
+    ans = []
+    for name in sorted(backends):
+        try:
+            new_solver(name).close()
+            ans.append(name)
+        except ImportError:
+            pass
+    return ans
+
+
+# -------- Benchmarking --------
+
+def benchmark_corpus(num_manifolds=200, slope=(2, 5), max_tets=35):
+    """
+    The fixed corpus used by benchmark: the given Dehn filling on each
+    of the first num_manifolds 1-cusped census manifolds, with the
+    default simplified triangulation.
+    """
+    import snappy
+    ans = []
+    for M in snappy.OrientableCuspedCensus(cusps=1)[:num_manifolds]:
+        M.dehn_fill(slope)
+        F = M.filled_triangulation()
+        F.simplify()
+        iso = F.triangulation_isosig(decorated=False)
+        if len(t3m.Mcomplex(iso)) <= max_tets:
+            ans.append(iso)
+    return ans
+
+def benchmark(methods=None, corpus=None, bucket=5, progress=True):
+    """
+    Times enumerating all acyclic orientations of each triangulation in
+    the corpus with each backend, checking that they agree.  Returns a
+    dict mapping (method, size class) to (models, seconds), where the
+    size class is the number of tetrahedra rounded down to a multiple
+    of bucket.  If progress is set, a table of models/sec is printed.
+
+    >>> ans = benchmark(['picosat'], ['jLvLQAQbffghghiiieuaiikktuu'], progress=False)
+    >>> ans['picosat', 5][0]
+    10
+    """
+    import time
+    from . import find_orient
+    if methods is None:
+        methods = available_backends()
+    if corpus is None:
+        corpus = benchmark_corpus()
+
+    ans = dict()
+    for iso in corpus:
+        T = t3m.Mcomplex(iso)
+        size = bucket * (len(T) // bucket)
+        answers = []
+        for method in methods:
+            start = time.time()
+            orients = list(find_orient.cycle_free_orientations(T, method))
+            elapsed = time.time() - start
+            answers.append(sorted(orients))
+            models, seconds = ans.get((method, size), (0, 0.0))
+            ans[method, size] = (models + len(orients), seconds + elapsed)
+        assert all(a == answers[0] for a in answers)
+
+    if progress:
+        sizes = sorted({size for method, size in ans})
+        print('num tet  ' + ''.join('%15s' % method for method in methods))
+        for size in sizes:
+            rates = []
+            for method in methods:
+                models, seconds = ans[method, size]
+                rates.append(models/seconds if seconds > 0 else float('inf'))
+            label = '%d-%d' % (size, size + bucket - 1)
+            print('%-9s' % label + ''.join('%15.0f' % r for r in rates))
+        print('(models/sec)')
+    return ans
+
+
+if __name__ == '__main__':
+    import sys
+    benchmark(sys.argv[1:] or None)
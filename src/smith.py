@@ -0,0 +1,407 @@
+"""
+Sparse integer matrices and their Smith normal forms, with the
+unimodular changes of basis, which is all that is needed to compute
+the integral (co)homology of the triangulated surfaces in surface.py
+and dual_cellulation.py without Sage.
+
+Boundary matrices of surfaces have at most three nonzero entries in
+each column, almost all of them 1 or -1, and stay sparse under
+elimination provided the pivots are chosen with care, so this is
+much faster than working with dense matrices.
+"""
+
+import functools
+
+def cached_method(method):
+    """
+    Caches the value of a method for each instance and tuple of
+    arguments, like Sage's decorator of the same name.
+    """
+    name = '_cached_' + method.__name__
+    @functools.wraps(method)
+    def cached(self, *args):
+        cache = self.__dict__.setdefault(name, dict())
+        if args not in cache:
+            cache[args] = method(self, *args)
+        return cache[args]
+    return cached
+
+class SparseMatrix(object):
+    """
+    An integer matrix, stored as a dict of the nonzero entries of
+    each row.  Supports the bits of Sage's interface used here.
+
+    >>> A = SparseMatrix(2, 3)
+    >>> A[0, 1] += 2
+    >>> A[1, 2] -= 1
+    >>> A
+    [[0, 2, 0], [0, 0, -1]]
+    >>> A * [1, 1, 1], A.transpose() * [1, 1]
+    ([2, -1], [0, 2, -1])
+    >>> A * A.transpose() == SparseMatrix.from_rows([[4, 0], [0, 1]])
+    True
+    >>> A.rank(), A * SparseMatrix(3, 4) == 0
+    (2, True)
+    """
+    def __init__(self, nrows, ncols, entries=None):
+        self.nrows, self.ncols = nrows, ncols
+        self._rows = [dict() for i in range(nrows)]
+        if entries is not None:
+            for (i, j), x in entries.items():
+                self[i, j] = x
+
+    @classmethod
+    def from_rows(cls, rows, ncols=None):
+        rows = [list(row) for row in rows]
+        if ncols is None:
+            ncols = len(rows[0]) if rows else 0
+        ans = cls(len(rows), ncols)
+        for i, row in enumerate(rows):
+            assert len(row) == ncols
+            ans._rows[i] = {j: x for j, x in enumerate(row) if x != 0}
+        return ans
+
+    @classmethod
+    def identity(cls, n):
+        return cls(n, n, {(i, i): 1 for i in range(n)})
+
+    def __getitem__(self, ij):
+        i, j = ij
+        return self._rows[i].get(j, 0)
+
+    def __setitem__(self, ij, value):
+        i, j = ij
+        if not (0 <= i < self.nrows and 0 <= j < self.ncols):
+            raise IndexError('Matrix index out of range')
+        if value == 0:
+            self._rows[i].pop(j, None)
+        else:
+            self._rows[i][j] = value
+
+    def dict(self):
+        return {(i, j): x for i, row in enumerate(self._rows) for j, x in row.items()}
+
+    def rows(self):
+        return [[row.get(j, 0) for j in range(self.ncols)] for row in self._rows]
+
+    def columns(self):
+        return self.transpose().rows()
+
+    def transpose(self):
+        ans = SparseMatrix(self.ncols, self.nrows)
+        for i, row in enumerate(self._rows):
+            for j, x in row.items():
+                ans._rows[j][i] = x
+        return ans
+
+    def __mul__(self, other):
+        if isinstance(other, SparseMatrix):
+            assert self.ncols == other.nrows
+            ans = SparseMatrix(self.nrows, other.ncols)
+            for i, row in enumerate(self._rows):
+                ans._rows[i] = _combination((x, other._rows[k]) for k, x in row.items())
+            return ans
+        other = list(other)
+        assert len(other) == self.ncols
+        return [sum(x*other[j] for j, x in row.items()) for row in self._rows]
+
+    def __eq__(self, other):
+        if isinstance(other, SparseMatrix):
+            return ((self.nrows, self.ncols, self._rows) ==
+                    (other.nrows, other.ncols, other._rows))
+        if other == 0:
+            return not any(self._rows)
+        return NotImplemented
+
+    def __ne__(self, other):
+        ans = self.__eq__(other)
+        return ans if ans is NotImplemented else not ans
+
+    def __repr__(self):
+        return repr(self.rows())
+
+    def rank(self):
+        return len(_smith(self).pivots)
+
+    def smith_form(self):
+        return smith_form(self)
+
+    def sage(self):
+        from sage.all import ZZ, matrix
+        return matrix(ZZ, self.nrows, self.ncols, self.dict(), sparse=True)
+
+
+def _combination(terms):
+    """
+    The sum of the given multiples of sparse rows.
+    """
+    ans = dict()
+    for c, row in terms:
+        for j, x in row.items():
+            y = ans.get(j, 0) + c*x
+            if y == 0:
+                ans.pop(j, None)
+            else:
+                ans[j] = y
+    return ans
+
+def _xgcd(a, b):
+    """
+    Returns (g, s, t) with g = gcd(a, b) = s*a + t*b.
+    """
+    s0, s1, t0, t1 = 1, 0, 0, 1
+    while b != 0:
+        q, r = divmod(a, b)
+        a, b = b, r
+        s0, s1 = s1, s0 - q*s1
+        t0, t1 = t1, t0 - q*t1
+    if a < 0:
+        a, s0, t0 = -a, -s0, -t0
+    return a, s0, t0
+
+class _Smith(object):
+    """
+    Reduces a copy of A to a matrix with a single nonzero entry in
+    each of the pivot rows and columns, and zeros elsewhere, by
+    unimodular row and column operations.  These are recorded in U
+    and V, so that U*A*V is the reduced matrix, along with their
+    inverses.  To have only row operations on sparse rows, V and the
+    inverses are stored transposed.
+    """
+    def __init__(self, A):
+        m, n = A.nrows, A.ncols
+        self.rows = [dict(row) for row in A._rows]
+        self.cols = [set() for j in range(n)]
+        for i, row in enumerate(self.rows):
+            for j in row:
+                self.cols[j].add(i)
+        self.U = [{i: 1} for i in range(m)]
+        self.U_inv_t = [{i: 1} for i in range(m)]
+        self.V_t = [{j: 1} for j in range(n)]
+        self.V_inv = [{j: 1} for j in range(n)]
+        self.pivots = []
+        active_rows = set(i for i in range(m) if self.rows[i])
+        while active_rows:
+            i, j = self._choose_pivot(active_rows)
+            i, j = self._clear(i, j)
+            self.pivots.append((i, j))
+            active_rows.discard(i)
+            active_rows = {k for k in active_rows if self.rows[k]}
+        self._fix_divisibility()
+
+    def _choose_pivot(self, active_rows):
+        """
+        An entry of least absolute value, and among those the one
+        which touches the fewest other entries.
+        """
+        best, best_key = None, None
+        for i in active_rows:
+            row = self.rows[i]
+            for j, x in row.items():
+                key = (abs(x), (len(row) - 1)*(len(self.cols[j]) - 1))
+                if best_key is None or key < best_key:
+                    best, best_key = (i, j), key
+                    if key == (1, 0):
+                        return best
+        return best
+
+    def _add_row(self, k, i, c):
+        """
+        row_k += c*row_i
+        """
+        if c == 0:
+            return
+        rows, cols = self.rows, self.cols
+        for j, x in rows[i].items():
+            y = rows[k].get(j, 0) + c*x
+            if y == 0:
+                del rows[k][j]
+                cols[j].discard(k)
+            else:
+                rows[k][j] = y
+                cols[j].add(k)
+        self.U[k] = _combination([(1, self.U[k]), (c, self.U[i])])
+        self.U_inv_t[i] = _combination([(1, self.U_inv_t[i]), (-c, self.U_inv_t[k])])
+
+    def _add_col(self, k, j, c):
+        """
+        col_k += c*col_j
+        """
+        if c == 0:
+            return
+        rows, cols = self.rows, self.cols
+        for i in list(cols[j]):
+            y = rows[i].get(k, 0) + c*rows[i][j]
+            if y == 0:
+                del rows[i][k]
+                cols[k].discard(i)
+            else:
+                rows[i][k] = y
+                cols[k].add(i)
+        self.V_t[k] = _combination([(1, self.V_t[k]), (c, self.V_t[j])])
+        self.V_inv[j] = _combination([(1, self.V_inv[j]), (-c, self.V_inv[k])])
+
+    def _clear(self, i, j):
+        """
+        Clears the rest of row i and column j, moving the pivot to a
+        smaller entry whenever a remainder is left.
+        """
+        while True:
+            p = self.rows[i][j]
+            for k in list(self.cols[j]):
+                if k != i:
+                    self._add_row(k, i, -(self.rows[k][j] // p))
+            for k in list(self.rows[i]):
+                if k != j:
+                    self._add_col(k, j, -(self.rows[i][k] // p))
+            left = ([(abs(self.rows[k][j]), k, j) for k in self.cols[j] if k != i] +
+                    [(abs(x), i, k) for k, x in self.rows[i].items() if k != j])
+            if not left:
+                return i, j
+            x, i, j = min(left)
+
+    def _fix_divisibility(self):
+        """
+        Makes the pivots positive and each divide the next, using the
+        identity diag(a, b) ~ diag(g, a*b/g) where g = gcd(a, b).
+        """
+        rows = self.rows
+        for i, j in self.pivots:
+            if rows[i][j] < 0:
+                self._negate_row(i)
+        P = self.pivots
+        for a in range(len(P)):
+            for b in range(a + 1, len(P)):
+                (i, j), (k, l) = P[a], P[b]
+                x, y = rows[i][j], rows[k][l]
+                if y % x != 0:
+                    g, s, t = _xgcd(x, y)
+                    self._combine_rows(i, k, (s, t, -y//g, x//g))
+                    self._combine_cols(j, l, (1, -t*y//g, 1, s*x//g))
+                    rows[i][j], rows[k][l] = g, x*y//g
+        self.pivots.sort(key=lambda ij: rows[ij[0]][ij[1]])
+
+    def _negate_row(self, i):
+        self.rows[i] = {j: -x for j, x in self.rows[i].items()}
+        self.U[i] = {j: -x for j, x in self.U[i].items()}
+        self.U_inv_t[i] = {j: -x for j, x in self.U_inv_t[i].items()}
+
+    def _combine_rows(self, i, k, M):
+        """
+        Replaces rows i and k of U by p*row_i + q*row_k and
+        r*row_i + s*row_k where M = (p, q, r, s) has determinant 1.
+        The pivot rows themselves are updated by the caller.
+        """
+        p, q, r, s = M
+        U, W = self.U, self.U_inv_t
+        U[i], U[k] = (_combination([(p, U[i]), (q, U[k])]),
+                      _combination([(r, U[i]), (s, U[k])]))
+        W[i], W[k] = (_combination([(s, W[i]), (-r, W[k])]),
+                      _combination([(-q, W[i]), (p, W[k])]))
+
+    def _combine_cols(self, j, l, M):
+        """
+        As _combine_rows, for the new columns M[0]*col_j + M[2]*col_l
+        and M[1]*col_j + M[3]*col_l.
+        """
+        p, q, r, s = M
+        V, W = self.V_t, self.V_inv
+        V[j], V[l] = (_combination([(p, V[j]), (r, V[l])]),
+                      _combination([(q, V[j]), (s, V[l])]))
+        W[j], W[l] = (_combination([(s, W[j]), (-q, W[l])]),
+                      _combination([(-r, W[j]), (p, W[l])]))
+
+    def diagonal(self):
+        return [self.rows[i][j] for i, j in self.pivots]
+
+    def row_order(self):
+        pivot_rows = [i for i, j in self.pivots]
+        used = set(pivot_rows)
+        return pivot_rows + [i for i in range(len(self.rows)) if i not in used]
+
+    def col_order(self):
+        pivot_cols = [j for i, j in self.pivots]
+        used = set(pivot_cols)
+        return pivot_cols + [j for j in range(len(self.cols)) if j not in used]
+
+def _smith(A):
+    return _Smith(A)
+
+def _from_sparse_rows(rows, ncols):
+    ans = SparseMatrix(len(rows), ncols)
+    ans._rows = [dict(row) for row in rows]
+    return ans
+
+def smith_form(A):
+    """
+    Returns (D, U, V) where U and V are unimodular and U*A*V = D is
+    diagonal, with nonnegative entries each dividing the next and the
+    zeros last, as with Sage's matrix.smith_form.
+
+    >>> A = SparseMatrix.from_rows([[2, 4, 4], [-6, 6, 12], [10, -4, -16]])
+    >>> D, U, V = smith_form(A)
+    >>> D
+    [[2, 0, 0], [0, 6, 0], [0, 0, 12]]
+    >>> U * A * V == D
+    True
+    >>> D, U, V = smith_form(SparseMatrix.from_rows([[1, 1], [1, 1], [0, 0]]))
+    >>> D, U * SparseMatrix.from_rows([[1, 1], [1, 1], [0, 0]]) * V == D
+    ([[1, 0], [0, 0], [0, 0]], True)
+    """
+    S = _smith(A)
+    rows, cols = S.row_order(), S.col_order()
+    D = SparseMatrix(A.nrows, A.ncols)
+    for k, d in enumerate(S.diagonal()):
+        D[k, k] = d
+    U = _from_sparse_rows([S.U[i] for i in rows], A.nrows)
+    V = _from_sparse_rows([S.V_t[j] for j in cols], A.ncols).transpose()
+    return D, U, V
+
+def homology_generators(incoming, outgoing):
+    """
+    For a chain complex C' --incoming--> C --outgoing--> C'', returns
+    a list of pairs (chain, order), one for each cyclic summand of
+    ker(outgoing)/im(incoming), where order is 0 for a copy of Z.  The
+    free summands come first.
+
+    The torus, with one vertex, edges a, b, c and two triangles:
+
+    >>> B1 = SparseMatrix(1, 3)
+    >>> B2 = SparseMatrix.from_rows([[1, -1], [1, -1], [-1, 1]])
+    >>> gens = homology_generators(B2, B1)
+    >>> [order for chain, order in gens]
+    [0, 0]
+    >>> cohomology = homology_generators(B1.transpose(), B2.transpose())
+    >>> SparseMatrix.from_rows([c for c, o in cohomology]) * SparseMatrix.from_rows([c for c, o in gens]).transpose()
+    [[1, 0], [0, 1]]
+
+    Torsion, from Z^2 --[[2, 0], [0, 3]]--> Z^2 --0--> 0:
+
+    >>> homology_generators(SparseMatrix.from_rows([[2, 0], [0, 3]]), SparseMatrix(0, 2))
+    [([-1, -1], 6)]
+    """
+    n = outgoing.ncols
+    assert incoming.nrows == n
+    # An integral basis for the kernel: the non-pivot columns of V.
+    S = _smith(outgoing)
+    pivot_cols = {j for i, j in S.pivots}
+    kernel = [j for j in range(n) if j not in pivot_cols]
+    # The image in terms of this basis, read off from V^-1 * incoming.
+    V_inv = _from_sparse_rows(S.V_inv, n)
+    coords = V_inv * incoming
+    assert all(not coords._rows[j] for j in pivot_cols)
+    X = _from_sparse_rows([coords._rows[j] for j in kernel], incoming.ncols)
+    # Quotient by the image, via the Smith form of X.
+    T = _smith(X)
+    order = dict()
+    for i, j in T.pivots:
+        order[i] = T.rows[i][j]
+    free = [i for i in range(len(kernel)) if i not in order]
+    torsion = [i for i, j in T.pivots if T.rows[i][j] != 1]
+    ans = []
+    for i in free + torsion:
+        # The chain is K times column i of U^-1, where K = V[:, kernel].
+        column = T.U_inv_t[i]
+        chain = _combination((c, S.V_t[kernel[k]]) for k, c in column.items())
+        ans.append(([chain.get(j, 0) for j in range(n)], order.get(i, 0)))
+    return ans
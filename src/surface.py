@@ -1,6 +1,5 @@
-from sage.all import (ZZ, matrix, vector, ChainComplex, cached_method,
-                      line, arrow, text)
 from collections import OrderedDict
+from .smith import SparseMatrix, cached_method, homology_generators
 
 class Triangle(object):
     """
@@ -259,7 +258,7 @@ class Surface:
         assert list(range(V)) == sorted(vertex_to_row.values())
         assert list(range(E)) == sorted(e.index for e in self.edges)
 
-        D = matrix(ZZ, V, E, sparse=True)
+        D = SparseMatrix(V, E)
         for e in self.edges:
             v_init = vertex_to_row[e.vertices[0]]
             v_term = vertex_to_row[e.vertices[1]]
@@ -277,7 +276,7 @@ class Surface:
         E, F = len(self.edges), len(self.triangles)
         assert list(range(E)) == sorted(e.index for e in self.edges)
         assert list(range(F)) == sorted(v.index for v in self.triangles)
-        D = matrix(ZZ, E, F, sparse=True)
+        D = SparseMatrix(E, F)
         for T in self.triangles:
             for S in T.oriented_sides():
                 E = S.edge()
@@ -307,14 +306,22 @@ class Surface:
         assert B1*B2 == 0
         r1, r2 = B1.rank(), B2.rank()
         b0 = len(self.vertices) - r1
-        b1 = B1.right_kernel().dimension() - B2.rank()
-        b2 = B2.right_kernel().dimension()
+        b1 = len(self.edges) - r1 - r2
+        b2 = len(self.triangles) - r2
         assert b0 - b1 + b2 == self.euler()
 
+    def boundary_maps(self):
+        """
+        The boundary maps B0, B1, B2, B3 of the chain complex, where
+        the first and last are zero.
+        """
+        V, E, F = len(self.vertices), len(self.edges), len(self.triangles)
+        return [SparseMatrix(0, V), self.B1(), self.B2(), SparseMatrix(F, 0)]
 
     @cached_method
     def chain_complex(self):
-         return ChainComplex( {1:self.B1(), 2:self.B2()} , degree=-1 )
+         from sage.all import ChainComplex
+         return ChainComplex( {1:self.B1().sage(), 2:self.B2().sage()} , degree=-1 )
 
     @cached_method
     def cochain_complex(self):
@@ -322,22 +329,18 @@ class Surface:
 
     @cached_method
     def betti(self, dimension=1):
-        C = self.chain_complex()
-        return C.betti(dimension)
+        B = self.boundary_maps()
+        return B[dimension].ncols - B[dimension].rank() - B[dimension + 1].rank()
 
     @cached_method
     def integral_cohomology_basis(self, dimension=1):
-        C = self.cochain_complex()
-        from sage.interfaces.chomp import have_chomp
-        if have_chomp():
-            if C.betti(1) != 0:
-                ans = C.homology(generators=True)[1][1]
-            else:
-                ans = []
-        else:
-            homology = C.homology(generators=True, algorithm='no_chomp')[dimension]
-            ans = [factor[1].vector(dimension) for factor in homology]
-
+        """
+        Computed with smith.homology_generators, as are the homology
+        generators below.
+        """
+        B = self.boundary_maps()
+        ans = [chain for chain, order in
+               homology_generators(B[dimension].transpose(), B[dimension + 1].transpose())]
         if dimension == 1:
             assert len(ans) == 2 - self.euler()
             ans = [OneCocycle(self, a) for a in ans]
@@ -345,17 +348,9 @@ class Surface:
 
     @cached_method
     def integral_homology_basis(self, dimension=1):
-        C = self.chain_complex()
-        from sage.interfaces.chomp import have_chomp
-        if have_chomp():
-            if C.betti(1) != 0:
-                ans = C.homology(generators=True)[1][1]
-            else:
-                ans = []
-        else:
-            homology = C.homology(generators=True, algorithm='no_chomp')[dimension]
-            ans = [factor[1].vector(dimension) for factor in homology]
-
+        B = self.boundary_maps()
+        ans = [chain for chain, order in
+               homology_generators(B[dimension + 1], B[dimension])]
         if dimension == 1:
             assert len(ans) == 2 - self.euler()
             ans = [OneCycle(self, a) for a in ans]
@@ -449,15 +444,14 @@ class Cycle:
 
 class OneCycle(Cycle):
     def check(self):
-        w = vector(self.weights)
         B1 = self.surface.B1()
-        if B1*w != 0:
+        if any(B1*self.weights):
             raise ValueError('OneCycle not in kernel of boundary map')
 
     def is_zero_in_homology(self):
         B2 = self.surface.B2().transpose()
         r1 = B2.rank()
-        r2 = matrix(list(B2) + [self.weights]).rank()
+        r2 = SparseMatrix.from_rows(B2.rows() + [self.weights], B2.ncols).rank()
         return r1 == r2
 
     def components(self):
@@ -506,7 +500,7 @@ class OneCycle(Cycle):
 
 class OneCocycle(Cycle):
     def check(self):
-        if self.surface.d1() * vector(self.weights) != 0:
+        if any(self.surface.d1() * self.weights):
             raise ValueError('Not in the kernel of d1')
 
     def __repr__(self):
@@ -0,0 +1,391 @@
+"""
+A queue of tasks in a local SQLite database, worked through by a pool
+of processes, in place of the external taskdb2 service.
+
+Each task is a dict, stored as JSON.  As with taskdb2, the function
+run on a task modifies it in place, setting task['done'] when it has
+found what it was looking for.  A task is claimed for a limited time
+(its lease), which is renewed while it is being worked on; if the
+worker dies the lease runs out and the task is claimed again, so an
+interrupted run resumes simply by starting it again.  Results are
+written back in batches, in one transaction each.
+
+The database uses write-ahead logging, which needs memory shared
+between the processes using it, so a queue can only be worked on
+from one node, and must be on a local disk: SQLite's locking is not
+reliable over NFS and other network filesystems, where the queue can
+be corrupted.  To spread the work over several nodes, give each its
+own database with its share of the tasks, and merge the results
+afterwards.  See database_from_environment, used by the scripts in
+cluster_scripts.
+"""
+
+import os
+import json
+import re
+import signal
+import socket
+import sqlite3
+import time
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+Statuses = ('pending', 'claimed', 'finished', 'failed')
+
+class TaskQueue(object):
+    """
+    >>> import tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'tasks.sqlite')
+    >>> Q = TaskQueue(path, 'task_fol')
+    >>> Q.add([{'name': 'm004(1, 2)'}, {'name': 'm003(-3, 1)'}, {'name': 'm006(1, 2)'}])
+    3
+    >>> [(id, task['name']) for id, task in Q.claim(2, lease=60)]
+    [(1, 'm004(1, 2)'), (2, 'm003(-3, 1)')]
+    >>> Q.finish([(1, {'name': 'm004(1, 2)', 'done': True}, None)])
+    >>> Q.release([2])
+    >>> Q.counts()
+    {'pending': 2, 'claimed': 0, 'finished': 1, 'failed': 0}
+    >>> [id for id, task in Q.claim(5, lease=-1)]
+    [2, 3]
+    >>> [id for id, task in Q.claim(5, lease=60)]  # leases ran out
+    [2, 3]
+    >>> [task.get('done', False) for task in Q.tasks()]
+    [True, False, False]
+
+    Tasks that have had max_attempts tries are failed rather than
+    being left pending, or claimed once their lease runs out.
+
+    >>> Q.release([3], max_attempts=2)
+    >>> Q.renew([2], lease=-1)
+    >>> Q.claim(5, lease=60, max_attempts=3)
+    []
+    >>> Q.counts()
+    {'pending': 0, 'claimed': 0, 'finished': 1, 'failed': 2}
+    >>> Q.requeue(max_attempts=3)
+    >>> Q.counts()['pending']
+    1
+    """
+    def __init__(self, path, table='tasks', timeout=60):
+        if not re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', table):
+            raise ValueError('Invalid table name %r' % table)
+        self.path = path
+        self.table = table
+        self.timeout = timeout
+        self._connection, self._pid = None, None
+
+    def _connect(self):
+        """
+        Connections must not be shared with forked processes, so each
+        process opens its own.
+        """
+        if self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS %s ('
+                         'id INTEGER PRIMARY KEY, data TEXT NOT NULL, '
+                         "status TEXT NOT NULL DEFAULT 'pending', "
+                         'worker TEXT, lease_until REAL, '
+                         'attempts INTEGER NOT NULL DEFAULT 0, error TEXT)'
+                         % self.table)
+            conn.execute('CREATE INDEX IF NOT EXISTS %s_status ON %s (status, lease_until)'
+                         % (self.table, self.table))
+            self._connection, self._pid = conn, os.getpid()
+        return self._connection
+
+    def _transaction(self, statements):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            ans = statements(conn)
+            conn.execute('COMMIT')
+        except:
+            conn.execute('ROLLBACK')
+            raise
+        return ans
+
+    def add(self, tasks):
+        rows = [(json.dumps(task),) for task in tasks]
+        self._transaction(lambda conn: conn.executemany(
+            'INSERT INTO %s (data) VALUES (?)' % self.table, rows))
+        return len(rows)
+
+    def _give_up(self, conn, max_attempts, where, params):
+        """
+        Fails the tasks matching the given condition that have already
+        been tried max_attempts times.
+        """
+        if max_attempts is not None:
+            conn.execute('UPDATE %s SET status = ?, lease_until = NULL, error = ? '
+                         'WHERE (%s) AND attempts >= ?' % (self.table, where),
+                         ('failed', 'Gave up after %d attempts' % max_attempts)
+                         + tuple(params) + (max_attempts,))
+
+    def claim(self, num, lease=3600, max_attempts=None):
+        """
+        Claims up to num tasks for lease seconds, returning a list of
+        (id, task) pairs.  Tasks whose lease has run out are claimed
+        again, unless they have been tried max_attempts times, in which
+        case they are failed.
+        """
+        now = time.time()
+        worker = '%s:%d' % (socket.gethostname(), os.getpid())
+        def statements(conn):
+            self._give_up(conn, max_attempts,
+                          'status = ? OR (status = ? AND lease_until < ?)',
+                          ('pending', 'claimed', now))
+            rows = conn.execute(
+                'SELECT id, data FROM %s WHERE status = ? OR '
+                '(status = ? AND lease_until < ?) '
+                'ORDER BY id LIMIT ?' % self.table,
+                ('pending', 'claimed', now, num)).fetchall()
+            conn.executemany(
+                'UPDATE %s SET status = ?, worker = ?, lease_until = ?, '
+                'attempts = attempts + 1 WHERE id = ?' % self.table,
+                [('claimed', worker, now + lease, id) for id, data in rows])
+            return rows
+        return [(id, json.loads(data)) for id, data in self._transaction(statements)]
+
+    def renew(self, ids, lease=3600):
+        until = time.time() + lease
+        self._transaction(lambda conn: conn.executemany(
+            'UPDATE %s SET lease_until = ? WHERE id = ? AND status = ?' % self.table,
+            [(until, id, 'claimed') for id in ids]))
+
+    def release(self, ids, max_attempts=None):
+        """
+        Returns claimed tasks to the queue without recording anything,
+        apart from failing those tried max_attempts times.
+        """
+        def statements(conn):
+            for id in ids:
+                self._give_up(conn, max_attempts, 'id = ? AND status = ?',
+                              (id, 'claimed'))
+            conn.executemany(
+                'UPDATE %s SET status = ?, lease_until = NULL WHERE id = ? AND status = ?'
+                % self.table, [('pending', id, 'claimed') for id in ids])
+        self._transaction(statements)
+
+    def finish(self, results):
+        """
+        Records a batch of (id, task, error) triples, where error is
+        None or the traceback of the exception raised.
+        """
+        rows = [('finished' if error is None else 'failed', json.dumps(task), error, id)
+                for id, task, error in results]
+        self._transaction(lambda conn: conn.executemany(
+            'UPDATE %s SET status = ?, data = ?, error = ?, lease_until = NULL '
+            'WHERE id = ?' % self.table, rows))
+
+    def requeue(self, failed=True, unfinished=False, max_attempts=None):
+        """
+        Makes failed tasks, and if unfinished is set also finished
+        tasks not marked 'done', pending again, except for those
+        already tried max_attempts times.
+        """
+        limit = 2**62 if max_attempts is None else max_attempts
+        def statements(conn):
+            if failed:
+                conn.execute('UPDATE %s SET status = ? WHERE status = ? AND attempts < ?'
+                             % self.table, ('pending', 'failed', limit))
+            if unfinished:
+                ids = [id for id, data in conn.execute(
+                    'SELECT id, data FROM %s WHERE status = ? AND attempts < ?'
+                    % self.table, ('finished', limit)) if not json.loads(data).get('done')]
+                conn.executemany('UPDATE %s SET status = ? WHERE id = ?' % self.table,
+                                 [('pending', id) for id in ids])
+        self._transaction(statements)
+
+    def counts(self):
+        rows = self._connect().execute(
+            'SELECT status, COUNT(*) FROM %s GROUP BY status' % self.table)
+        ans = {status: 0 for status in Statuses}
+        ans.update(rows)
+        return ans
+
+    def tasks(self, status=None):
+        conn = self._connect()
+        if status is None:
+            rows = conn.execute('SELECT data FROM %s ORDER BY id' % self.table)
+        else:
+            rows = conn.execute('SELECT data FROM %s WHERE status = ? ORDER BY id'
+                                % self.table, (status,))
+        for data, in rows:
+            yield json.loads(data)
+
+
+# The filesystem types, as listed in /proc/mounts, which are shared
+# between nodes and on which the queue is therefore unsafe.
+NetworkFilesystems = ('nfs', 'nfs4', 'cifs', 'smbfs', 'smb3', 'lustre', 'gpfs',
+                      'beegfs', 'ceph', 'glusterfs', 'afs', '9p', 'fuse.sshfs')
+
+def filesystem_type(path):
+    """
+    The type of the filesystem holding path, according to
+    /proc/mounts, or None if that cannot be read.
+
+    >>> filesystem_type('/proc')
+    'proc'
+    """
+    path = os.path.realpath(path)
+    try:
+        with open('/proc/mounts') as mounts:
+            entries = [line.split()[1:3] for line in mounts]
+    except OSError:
+        return None
+    best, ans = '', None
+    for mount, kind in entries:
+        mount = mount.replace('\\040', ' ')
+        inside = path == mount or path.startswith(mount.rstrip('/') + '/')
+        if inside and len(mount) >= len(best):
+            best, ans = mount, kind
+    return ans
+
+def database_from_environment(variable='FOLIAR_TASK_DB'):
+    """
+    The path of a queue's database given by the environment variable,
+    which must be set, checking that it is not on a network
+    filesystem; see the top of this module.
+    """
+    path = os.environ.get(variable)
+    if not path:
+        raise ValueError('Set %s to the path of the task database, on a disk '
+                         'local to this node' % variable)
+    kind = filesystem_type(os.path.dirname(os.path.abspath(path)))
+    if kind in NetworkFilesystems:
+        raise ValueError('The task database %s is on a %s filesystem, where '
+                         "SQLite's locking is unsafe; put it on a local disk"
+                         % (path, kind))
+    return path
+
+
+# The function being run, installed in each worker when it is forked,
+# so that it need not be picklable.
+_function = None
+
+def _init_worker(function):
+    global _function
+    _function = function
+
+def _run_task(job):
+    id, task = job
+    try:
+        _function(task)
+        return id, task, None
+    except Exception:
+        return id, task, traceback.format_exc()
+
+def run_function(path, table, function, workers=None, batch_size=None,
+                 lease=3600, commit_interval=60, max_tasks=None, max_attempts=3):
+    """
+    Runs function on the tasks in the given table of the TaskQueue at
+    path, using a pool of this many processes, until none are left
+    or max_tasks have been done.  Tasks are claimed a batch at a time
+    and the results written back every batch_size tasks or
+    commit_interval seconds, whichever comes first.  Returns the
+    number of tasks finished.
+
+    If a worker dies, or the run is interrupted, the other workers are
+    stopped and the tasks in progress returned to the queue, and the
+    exception, e.g. BrokenProcessPool, is raised; a task is failed
+    rather than claimed again after max_attempts tries.
+
+    >>> import tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'tasks.sqlite')
+    >>> TaskQueue(path, 'squares').add([{'n': n} for n in range(10)])
+    10
+    >>> def square(task):
+    ...     task['square'] = task['n']**2
+    ...     task['done'] = task['n'] % 2 == 0
+    >>> run_function(path, 'squares', square, workers=2, batch_size=3)
+    10
+    >>> Q = TaskQueue(path, 'squares')
+    >>> [task['square'] for task in Q.tasks()]
+    [0, 1, 4, 9, 16, 25, 36, 49, 64, 81]
+    >>> Q.requeue(unfinished=True)
+    >>> Q.counts()['pending'], run_function(path, 'squares', square, workers=1)
+    (5, 5)
+    >>> Q.add([{'n': 10}])
+    1
+    >>> run_function(path, 'squares', lambda task: 1/0, workers=1)
+    0
+    >>> Q.counts()['failed']
+    1
+    >>> Q.requeue()
+    >>> run_function(path, 'squares', lambda task: os._exit(1), workers=1)  # doctest: +IGNORE_EXCEPTION_DETAIL
+    Traceback (most recent call last):
+        ...
+    BrokenProcessPool: A process in the process pool was terminated abruptly
+    >>> Q.counts()['pending'], run_function(path, 'squares', square, max_attempts=2)
+    (1, 0)
+    >>> Q.counts()['pending'], Q.counts()['failed']
+    (0, 1)
+    >>> Q.add([{'n': 11}, {'n': 12}])
+    2
+    >>> def stop(task):
+    ...     if task['n'] == 11:
+    ...         os.kill(os.getppid(), signal.SIGINT)
+    ...     time.sleep(60)
+    >>> start = time.time()
+    >>> try:
+    ...     run_function(path, 'squares', stop, workers=2)
+    ... except KeyboardInterrupt:
+    ...     print('interrupted')
+    interrupted
+    >>> time.time() - start < 30, Q.counts()['pending'], Q.counts()['claimed']
+    (True, 2, 0)
+    """
+    Q = TaskQueue(path, table)
+    if workers is None:
+        workers = os.cpu_count()
+    if batch_size is None:
+        batch_size = 2*workers
+
+    finished, processed = 0, 0
+    results, running = [], dict()
+    last_commit = time.time()
+    def record(results):
+        Q.finish(results)
+        return sum(error is None for id, task, error in results)
+
+    context = multiprocessing.get_context('fork')
+    pool = ProcessPoolExecutor(workers, context, _init_worker, (function,))
+    try:
+        while True:
+            room = 2*workers - len(running)
+            if max_tasks is not None:
+                room = min(room, max_tasks - processed - len(results) - len(running))
+            if room >= min(batch_size, workers) or (room > 0 and not running):
+                for id, task in Q.claim(room, lease, max_attempts):
+                    running[pool.submit(_run_task, (id, task))] = id
+            if not running:
+                break
+            ready, _ = wait(running, commit_interval, FIRST_COMPLETED)
+            for future in ready:
+                results.append(future.result())
+                del running[future]
+            now = time.time()
+            if len(results) >= batch_size or now - last_commit >= commit_interval:
+                finished += record(results)
+                processed += len(results)
+                results = []
+                if running:
+                    Q.renew(running.values(), lease)
+                last_commit = now
+    finally:
+        if running:
+            # Stop the workers before their tasks are released, so no
+            # other pool can start on them while these still run.
+            processes = list((pool._processes or {}).values())
+            pool.shutdown(wait=False, cancel_futures=True)
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
+        pool.shutdown(wait=True)
+        if results:
+            finished += record(results)
+        if running:
+            Q.release(running.values(), max_attempts)
+    return finished
@@ -1,17 +1,28 @@
 import sys, getopt
 import doctest
+import importlib
+import subprocess
 
-from . import dual_cellulation, edge_orient, find_orient, link, peripheral, util, main
-modules = [dual_cellulation, edge_orient, find_orient, link, peripheral, util, main]
+module_names = ['dual_cellulation', 'edge_orient', 'find_orient', 'link', 'peripheral',
+                'util', 'main', 'sat_backends', 'compiled', 'isosig', 'result_cache',
+                'task_queue', 'smith', 'surface']
 
-def verbose():
+# What closed and cusped searches import, none of which may need Sage.
+sage_free_modules = ['foliar', 'foliar.find_orient', 'foliar.edge_orient',
+                     'foliar.util', 'foliar.main', 'foliar.compiled',
+                     'foliar.sat_backends', 'foliar.task_queue',
+                     'foliar.peripheral', 'foliar.dual_cellulation',
+                     'foliar.surface', 'foliar.link']
+
+def options():
     try:
-        optlist, args = getopt.getopt(sys.argv[1:], 'v', ['verbose'])
-        opts = [o[0] for o in optlist]
-        verbose = '-v' in opts
+        optlist, args = getopt.getopt(sys.argv[1:], 'vi', ['verbose', 'imports'])
+        return [o[0] for o in optlist]
     except getopt.GetoptError:
-        verbose = False
-    return verbose
+        return []
+
+def verbose():
+    return '-v' in options() or '--verbose' in options()
 
 def doctest_globals(module):
     if hasattr(module, 'doctest_globals'):
@@ -19,9 +30,49 @@ def doctest_globals(module):
     else:
         return dict()
 
+def import_time(module, preload='sys', repeat=3):
+    """
+    The least time in seconds taken to import the given module in a
+    fresh Python process, after the preloaded ones, and whether doing
+    so loaded Sage.
+    """
+    code = ('import sys, time, %s; start = time.perf_counter(); import %s; '
+            'print(time.perf_counter() - start, "sage.all" in sys.modules)'
+            % (preload, module))
+    times = []
+    for i in range(repeat):
+        out = subprocess.run([sys.executable, '-c', code], check=True,
+                             stdout=subprocess.PIPE, universal_newlines=True).stdout
+        seconds, sage = out.split()
+        times.append(float(seconds))
+    return min(times), sage == 'True'
+
+def import_benchmark(max_overhead=0.5, repeat=3):
+    """
+    Times importing each of sage_free_modules, beyond the time taken
+    to import snappy itself, and returns the number of them which
+    either load Sage or take more than max_overhead seconds.
+    """
+    print('snappy: %.3fs' % import_time('snappy', repeat=repeat)[0])
+    failed = 0
+    for module in sage_free_modules:
+        overhead, sage = import_time(module, 'snappy', repeat)
+        bad = sage or overhead > max_overhead
+        failed += bad
+        print('    %s: +%.3fs%s%s' % (module, overhead, ' loads Sage' if sage else '',
+                                     ' FAILED' if bad else ''))
+    return failed
+
 if __name__ == '__main__':
+    if '-i' in options() or '--imports' in options():
+        failed = import_benchmark()
+        print('\nImport benchmark:\n    %d failures out of %d modules.'
+              % (failed, len(sage_free_modules)))
+        sys.exit(failed > 0)
+
     failed, attempted = 0, 0
-    for module in modules:
+    for name in module_names:
+        module = importlib.import_module('foliar.' + name)
         print(module.__name__)
         result = doctest.testmod(module,
                                  extraglobs=doctest_globals(module),
@@ -30,6 +81,3 @@ if __name__ == '__main__':
         failed += result.failed
         attempted += result.attempted
     print('\nAll doctests:\n    %s failures out of %s tests.' % (failed, attempted))
-
-    
-        
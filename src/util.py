@@ -1,6 +1,6 @@
 import snappy
 import snappy.snap.t3mlite as t3m
-import regina
+import multiprocessing
 
 def closed_from_isosig(isosig):
     """
@@ -17,11 +17,10 @@ def closed_from_isosig(isosig):
     """
     return t3m.Mcomplex(isosig)
         
-def closed_isosigs(snappy_manifold, trys=20, max_tets=50):
+def _surgery_descriptions(snappy_manifold):
     """
-    >>> M = snappy.Manifold('m004(1,2)')
-    >>> len(closed_isosigs(M, trys=5)) > 0
-    True
+    The given closed manifold, together with its descriptions as
+    fillings on the complements of its dual curves.
     """
     M = snappy_manifold.copy()
     assert M.cusp_info('complete?') == [False]
@@ -31,32 +30,228 @@ def closed_isosigs(snappy_manifold, trys=20, max_tets=50):
         N = M.drill(curve)
         N.dehn_fill((1,0), 1)
         surgery_descriptions.append(N.filled_triangulation([0]))
+    return surgery_descriptions
+
+def _seed_snappea(seed):
+    """
+    SnapPea's randomize draws from the C library's rand, so seeding
+    that makes a run of randomizations reproducible.  This changes the
+    random numbers of the whole process, so is only done in the
+    workers of a pool.
+    """
+    import ctypes
+    ctypes.CDLL(None).srand(seed)
 
-    ans = set()
-    for N in surgery_descriptions:
+def _seeded_descriptions(job):
+    """
+    The surgery descriptions of _surgery_descriptions, as strings, with
+    the drilling seeded; run by a worker, as is _randomized_chain.
+    """
+    description, seed = job
+    _seed_snappea(seed)
+    M = snappy.Manifold(description)
+    return [N._to_string() for N in _surgery_descriptions(M)]
+
+def _randomized_chain(job):
+    """
+    The job done by each worker of _closed_isosigs_with_sizes: starting
+    from a surgery description, randomizes it the given number of
+    times, returning the (round, num_tet, isosig) found along the way.
+    """
+    description, seed, first_round, rounds, max_tets = job
+    _seed_snappea(seed)
+    N = snappy.Manifold(description)
+    ans = []
+    for i in range(first_round, first_round + rounds):
+        T = N.filled_triangulation()
+        if T._num_fake_cusps() == 1:
+            n = T.num_tetrahedra()
+            if n <= max_tets:
+                ans.append((i, n, T.triangulation_isosig(decorated=False)))
+        N.randomize()
+    return ans
+
+def _closed_isosigs_with_sizes(snappy_manifold, trys, max_tets, workers=None, seeds=None,
+                               adaptive=False):
+    """
+    Yields pairs (num_tet, isosig) as soon as they are found.  The
+    surgery descriptions are randomized in rounds, each round
+    yielding its new isosigs smallest first.
+
+    If workers or seeds is given, the trys rounds are instead split
+    into one independent chain of randomizations per seed, each
+    applied to every surgery description, and these chains are run
+    by a pool of workers, by default just one.  Each worker seeds
+    SnapPea's random numbers for each chain, leaving those of the
+    calling process alone.  The output is reproducible only for a
+    fixed list of seeds, by default range(workers), so a fixed worker
+    count, and a fixed trys, as together these determine how the
+    rounds are chunked into chains.
+
+    If adaptive is set, the budget is spent as described in
+    _adaptive_closed_isosigs_with_sizes instead.
+    """
+    if adaptive:
+        if workers is not None or seeds is not None:
+            raise ValueError('The adaptive schedule is sequential')
+        for n_iso in _adaptive_closed_isosigs_with_sizes(snappy_manifold, trys, max_tets):
+            yield n_iso
+        return
+    if workers is None and seeds is None:
+        surgery_descriptions = _surgery_descriptions(snappy_manifold)
+        seen = set()
         for i in range(trys):
-            T = N.filled_triangulation()
-            if T._num_fake_cusps() == 1:
-                n = T.num_tetrahedra()
-                if n <= max_tets:
-                    ans.add((n, T.triangulation_isosig(decorated=False)))
-            N.randomize()
+            new = set()
+            for N in surgery_descriptions:
+                T = N.filled_triangulation()
+                if T._num_fake_cusps() == 1:
+                    n = T.num_tetrahedra()
+                    if n <= max_tets:
+                        iso = T.triangulation_isosig(decorated=False)
+                        if iso not in seen:
+                            seen.add(iso)
+                            new.add((n, iso))
+                N.randomize()
+            for n_iso in sorted(new):
+                yield n_iso
+        return
+
+    seeds = list(range(workers) if seeds is None else seeds)
+    rounds = -(-trys // len(seeds))
+    pool = multiprocessing.Pool(1 if workers is None else max(workers, 1))
+    try:
+        # Drilling is randomized too.
+        descriptions = pool.apply(_seeded_descriptions,
+                                  ((snappy_manifold._to_string(), seeds[0]),))
+        jobs = []
+        for k, seed in enumerate(seeds):
+            first = k*rounds
+            for j, D in enumerate(descriptions):
+                if first < trys:
+                    chain_seed = (seed*1000003 + j) % 2**31
+                    jobs.append((D, chain_seed, first, min(rounds, trys - first), max_tets))
+
+        seen = set()
+        for found in pool.imap(_randomized_chain, jobs):
+            new = set()
+            for i, n, iso in found:
+                if iso not in seen:
+                    seen.add(iso)
+                    new.add((n, iso))
+            for n_iso in sorted(new):
+                yield n_iso
+    finally:
+        pool.terminate()
+
+def _adaptive_closed_isosigs_with_sizes(snappy_manifold, trys, max_tets,
+                                        patience=None, slack=1, decay=0.9):
+    """
+    Like _closed_isosigs_with_sizes, but the trys randomizations per
+    surgery description are pooled into one budget and spent where
+    they pay off.  A new isosig counts as small if it has at most
+    slack more tetrahedra than the smallest found so far.  Each step
+    randomizes the description with the best upper confidence bound
+    on its recent rate of new small isosigs, tracked as a moving
+    average with the given decay, so productive descriptions get most
+    of the budget while the others are still retried now and then.
+    Stops early once patience steps in a row, by default trys//4,
+    have found nothing new and small.
+    """
+    import math
+    surgery_descriptions = _surgery_descriptions(snappy_manifold)
+    k = len(surgery_descriptions)
+    if patience is None:
+        patience = max(trys//4, 1)
+    rate = k*[1.0]
+    calls = k*[0]
+    seen = set()
+    smallest = max_tets
+    idle = 0
+    for step in range(trys*k):
+        if idle >= patience:
+            return
+        if step < k:
+            j = step
+        else:
+            bound = lambda i: rate[i] + math.sqrt(2*math.log(step)/calls[i])
+            j = max(range(k), key=bound)
+        N = surgery_descriptions[j]
+        T = N.filled_triangulation()
+        small = 0
+        if T._num_fake_cusps() == 1:
+            n = T.num_tetrahedra()
+            if n <= max_tets:
+                iso = T.triangulation_isosig(decorated=False)
+                if iso not in seen:
+                    seen.add(iso)
+                    smallest = min(smallest, n)
+                    small = int(n <= smallest + slack)
+                    yield n, iso
+        N.randomize()
+        calls[j] += 1
+        rate[j] = decay*rate[j] + (1 - decay)*small
+        idle = 0 if small else idle + 1
 
+def closed_isosigs(snappy_manifold, trys=20, max_tets=50, workers=None, seeds=None,
+                   adaptive=False):
+    """
+    With workers or seeds, the retriangulation is done in parallel.
+    With adaptive, the randomizations go mostly to the surgery
+    descriptions that keep producing new small triangulations, and
+    stop once they dry up; this typically finds the smallest ones
+    with a fraction of the SnapPy calls.  See
+    _closed_isosigs_with_sizes.
+
+    >>> M = snappy.Manifold('m004(1,2)')
+    >>> len(closed_isosigs(M, trys=5)) > 0
+    True
+    >>> A = closed_isosigs(M, trys=6, seeds=[1, 2])
+    >>> B = closed_isosigs(M, trys=6, workers=2, seeds=[1, 2])
+    >>> A == B and len(A) > 0
+    True
+    >>> len(closed_isosigs(M, trys=20, adaptive=True)) > 0
+    True
+    """
+    ans = _closed_isosigs_with_sizes(snappy_manifold, trys, max_tets, workers, seeds,
+                                     adaptive)
     return [iso for n, iso in sorted(ans)]
 
+def closed_isosigs_iter(snappy_manifold, trys=20, max_tets=50, workers=None, seeds=None,
+                        adaptive=False):
+    """
+    Like closed_isosigs, but yields the isosigs as soon as they are
+    found, so the order is only roughly by size.
+
+    >>> M = snappy.Manifold('m004(1,2)')
+    >>> isosigs = closed_isosigs_iter(M, trys=5)
+    >>> N = t3m.Mcomplex(next(isosigs))
+    >>> len(N.Vertices), N.snappy_manifold().homology()
+    (1, 0)
+    """
+    ans = _closed_isosigs_with_sizes(snappy_manifold, trys, max_tets, workers, seeds,
+                                     adaptive)
+    for n, iso in ans:
+        yield iso
+
 def cusped_triangulations(snappy_manifold, trys=1000):
     """
+    Yields the given triangulation and then each combinatorially
+    distinct one found by randomizing it trys times.  These are told
+    apart by their isosigs, so the time taken is linear in trys.
+
     >>> M = snappy.Manifold('m004')
-    >>> len(cusped_triangulations(M, trys=100))
+    >>> len(list(cusped_triangulations(M, trys=100)))
     1
     """
     M = snappy.Triangulation(snappy_manifold)
-    ans = [M.copy()]
-    for i in range(trys):
-        M.randomize()
-        if {len(M.isomorphisms_to(N)) > 0 for N in ans} == {False}:
-            ans.append(M.copy())
-    return ans
+    seen = set()
+    for i in range(trys + 1):
+        if i > 0:
+            M.randomize()
+        isosig = M.triangulation_isosig(decorated=False)
+        if isosig not in seen:
+            seen.add(isosig)
+            yield M.copy()
 
 def cusped_isosigs(snappy_manifold, trys=1000):
     """